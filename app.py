@@ -1,97 +1,160 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from PIL import Image
-import base64
-import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
+import logging
+import math
 import re
+import threading
+import time
+from html import escape
+from config import config_version, get_snapshot
+from enquiries import Enquiry, get_enquiry_log, get_rate_limiter
+from catalog import get_catalog
+from routing import (PAGE_SIZES, TABS, begin_action, count_run, menu_key, navigate,
+                     parse_route, prefill_enquiry, rerun_stats, update_query)
+from filters import FEATURE_FLAGS, SORT_KEYS, ListingQuery, get_columns
+from geo import GAZETTEER, find_town, get_spatial_index, similar_nearby
+from search import get_search_index
+from market import ALL_DISTRICTS, SQFT_PER_ACRE, format_rupees, get_market_view
+from images import derivatives_version, image_html
+from fragments import fragment
+import metrics
+from markup import (ABOUT_STORY, HOME_HEADER, HOME_WELCOME, about_image_html, contact_details_markdown,
+                    contact_info, featured_grid_html, footer_html, social_links_html)
+from bundle import get_bundle
 
-# Initialize session state for form
-if 'form_submitted' not in st.session_state:
-    st.session_state.form_submitted = False
-if 'enquiry_property' not in st.session_state:
-    st.session_state.enquiry_property = None
+logger = logging.getLogger(__name__)
 
-# Load configuration from Streamlit secrets or .env file
-def get_config(key, default=None):
-    """Get configuration from Streamlit secrets or .env file"""
-    try:
-        # First try to get from Streamlit secrets (for production)
-        if key in st.secrets:
-            return st.secrets[key]
-        # Fall back to .env file (for local development)
-        load_dotenv()
-        return os.getenv(key, default)
-    except Exception as e:
-        # If secrets aren't available, fall back to environment variables
-        load_dotenv()
-        return os.getenv(key, default)
+# Notifications still outstanding this soon after submission (plus the digest
+# window) may be in flight
+RETRY_GRACE = 600
+
+def email_configured(config):
+    return all([config.get('EMAIL_HOST_USER'), config.get('RECIPIENT_EMAIL'),
+                config.get_str('EMAIL_HOST_PASSWORD')])
+
+@metrics.timed("send_email")
+def send_email(enquiry, on_result=None, screen=None):
+    """Score the lead, then hand the enquiry to the notifier (its own email or the next digest).
 
-def send_email(name, email, phone, message, property_name=None):
-    """Send an email with the enquiry details using Gmail SMTP"""
+    Both happen off the request path. screen(lead_check) may return False to
+    hold the notification back.
+    """
+    # Loaded on first use: most sessions never send an email
+    from leads import get_lead_checker
+    from notify import get_notifier
     try:
         # Email configuration
-        sender_email = get_config('EMAIL_HOST_USER')
-        receiver_email = get_config('RECIPIENT_EMAIL')
-        password = get_config('EMAIL_HOST_PASSWORD', '').strip('"\'')
-        
-        if not all([sender_email, receiver_email, password]):
+        if not email_configured(get_snapshot()):
             st.error("Email configuration is incomplete. Please check your settings.")
             return False
         
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = receiver_email
-        msg['Subject'] = f"New Property Enquiry - {property_name if property_name else 'General'}"
-        
-        # Email body
-        body = f"""
-        <h2>New Property Enquiry</h2>
-        <p><strong>Property:</strong> {property_name if property_name else 'General Enquiry'}</p>
-        <p><strong>Name:</strong> {name}</p>
-        <p><strong>Email:</strong> {email}</p>
-        <p><strong>Phone:</strong> {phone}</p>
-        <p><strong>Message:</strong></p>
-        <p>{message}</p>
-        """
+        notifier = get_notifier()
         
-        msg.attach(MIMEText(body, 'html'))
+        def deliver(lead):
+            if screen is None or screen(lead):
+                try:
+                    queued = notifier.submit(enquiry, on_result=on_result, lead=lead)
+                except Exception as e:
+                    # Building or queuing the message failed: report it like any failed delivery
+                    logger.exception("Could not queue the enquiry notification")
+                    queued, detail = False, str(e)
+                else:
+                    detail = "not queued"
+                if not queued and on_result:
+                    on_result(False, detail)
         
-        # Send email with better error handling
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            
-            try:
-                server.login(sender_email, password)
-                server.sendmail(sender_email, receiver_email, msg.as_string())
-                return True
-            except smtplib.SMTPAuthenticationError as e:
-                st.error("Authentication failed. Please check your email and App Password.")
-                st.error(f"Error details: {str(e)}")
-                return False
-            except Exception as e:
-                st.error(f"Error sending email: {str(e)}")
-                return False
+        # Lead lookups, rendering, batching and SMTP retries happen off the request path
+        get_lead_checker().check(enquiry.email, deliver)
+        return True
                 
     except Exception as e:
         st.error(f"An unexpected error occurred: {str(e)}")
         return False
 
+def submit_enquiry(name, email, phone, subject, message, property_name):
+    """Log the enquiry durably, then queue the notification email.
+
+    Returns False if the visitor is being rate limited. Resubmitting the same
+    form in the same session is recorded and notified only once.
+    """
+    if 'session_id' not in st.session_state:
+        import uuid
+        st.session_state.session_id = uuid.uuid4().hex
+    enquiry = Enquiry(
+        session_id=st.session_state.session_id,
+        name=name, email=email, phone=phone, subject=subject,
+        property_name=property_name, message=message,
+    )
+    key = enquiry.idempotency_key
+    if st.session_state.get('last_enquiry_key') == key:
+        return True
+    if not get_rate_limiter().allow(("session", enquiry.session_id), ("phone", phone), ("email", email.lower())):
+        return False
+    
+    log = get_enquiry_log()
+    enquiry_id, duplicate = log.append(enquiry)
+    st.session_state.last_enquiry_key = key
+    if duplicate:
+        return True
+    
+    notify_enquiry(log, enquiry_id, enquiry)
+    return True
+
+def notify_enquiry(log, enquiry_id, enquiry):
+    """Queue the notification for a logged enquiry, recording the outcome as events"""
+    def on_result(ok, detail):
+        metrics.incr("notifications.sent" if ok else "notifications.failed")
+        log.record_event(enquiry_id, "notified" if ok else "notify_failed", detail)
+    
+    min_score = get_snapshot().get_int('LEAD_MIN_SCORE', 0)
+    
+    def screen(lead):
+        log.record_event(enquiry_id, "lead_scored", lead.detail())
+        if lead.score < min_score:
+            metrics.incr("leads.held")
+            log.record_event(enquiry_id, "held", f"lead score {lead.score} below {min_score}")
+            return False
+        return True
+    
+    if not send_email(enquiry, on_result=on_result, screen=screen):
+        log.record_event(enquiry_id, "notify_failed", "not queued")
+
+def retry_notifications():
+    """Re-send notifications that failed or were lost to a restart (NOTIFY_RETRY_HOURS back)"""
+    config = get_snapshot()
+    if not email_configured(config):
+        return
+    try:
+        log = get_enquiry_log()
+        now = time.time()
+        pending = log.unnotified(
+            since=now - config.get_float('NOTIFY_RETRY_HOURS', 72.0) * 3600,
+            until=now - RETRY_GRACE - config.get_float('NOTIFY_DIGEST_WINDOW', 60.0),
+        )
+        if pending:
+            logger.info("Retrying %d enquiry notifications", len(pending))
+        for enquiry_id, enquiry in pending:
+            log.record_event(enquiry_id, "retried")
+            notify_enquiry(log, enquiry_id, enquiry)
+    except Exception:
+        logger.exception("Could not retry enquiry notifications")
+
+@st.cache_resource(show_spinner=False)
+def start_notification_retry(version):
+    # Once per process and config version (e.g. after the SMTP settings are fixed),
+    # in the background so the page doesn't wait for it
+    threading.Thread(target=retry_notifications, name="notify-retry", daemon=True).start()
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_PATTERN = re.compile(r'^[6-9]\d{9}$')
+
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone):
     """Validate Indian phone number"""
-    pattern = r'^[6-9]\d{9}$'
-    return re.match(pattern, phone) is not None
+    return PHONE_PATTERN.match(phone) is not None
 
 # Page configuration
 st.set_page_config(
@@ -103,391 +166,479 @@ st.set_page_config(
 
 # Custom CSS
 def load_css():
-    st.markdown("""
-    <style>
-        /* Main container */
-        .main {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 0 1rem;
-        }
-        
-        /* Header */
-        .header {
-            background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
-            color: white;
-            padding: 2rem 0;
-            text-align: center;
-            border-radius: 10px;
-            margin-bottom: 2rem;
-        }
-        
-        /* Property cards */
-        .property-card {
-            border-radius: 10px;
-            overflow: hidden;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            transition: transform 0.3s;
-            margin-bottom: 2rem;
-            background: white;
-        }
-        
-        .property-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 6px 12px rgba(0, 0, 0, 0.15);
-        }
-        
-        /* Contact form */
-        .contact-form {
-            background: #f8f9fa;
-            padding: 2rem;
-            border-radius: 10px;
-            margin-top: 2rem;
-        }
-        
-        /* Footer */
-        .footer {
-            background: #2c3e50;
-            color: white;
-            padding: 2rem 0;
-            margin-top: 3rem;
-            text-align: center;
-        }
-        
-        /* Responsive design */
-        @media (max-width: 768px) {
-            .property-card {
-                margin-bottom: 1.5rem;
-            }
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(get_bundle().style_tag, unsafe_allow_html=True)
 
-def main():
-    # Load CSS
-    load_css()
+def start_enquiry(property_name):
+    """Button callback: open the Contact tab pre-filled for a listing in the same run"""
+    begin_action("enquire")
+    prefill_enquiry(property_name)
+    navigate("Contact", property=property_name)
+
+def on_tab_change(key):
+    """Menu callback: switch tabs and update the URL"""
+    begin_action("nav")
+    navigate(st.session_state[key], from_menu=True)
+
+# Required contact form fields and the message shown when one is missing
+CONTACT_FIELDS = ('contact_name', 'contact_email', 'contact_phone', 'contact_message')
+
+def contact_form_error(name, email, phone, message):
+    """Message for the first problem with the contact form, or None"""
+    if not all([name, email, phone, message]):
+        return "Please fill in all required fields."
+    if not validate_email(email):
+        return "Please enter a valid email address."
+    if not validate_phone(phone):
+        return "Please enter a valid 10-digit Indian phone number."
+    return None
+
+def submit_contact_form():
+    """Form callback: validate and submit the enquiry before the page re-renders"""
+    begin_action("submit")
+    state = st.session_state
+    name, email, phone, message = (state.get(key, "") for key in CONTACT_FIELDS)
+    property_name = state.enquiry_property or ""
+    with metrics.timer("form_validation"):
+        error = contact_form_error(name, email, phone, message)
+    if error:
+        metrics.incr("form.invalid")
+        state.contact_error = error
+    elif submit_enquiry(name, email, phone, state.get('contact_subject', ""), message,
+                        property_name or "General Enquiry"):
+        state.form_submitted = True
+        for key in CONTACT_FIELDS:
+            state.pop(key, None)
+    else:
+        state.contact_error = "You've sent several enquiries already. Please try again later or contact us directly."
+
+def reset_contact_form():
+    """Button callback: show an empty contact form again"""
+    begin_action("reset")
+    prefill_enquiry(None)
+
+def open_listing(slug):
+    """Button callback: show one listing's full details"""
+    begin_action("open_listing")
+    update_query(listing=slug)
+
+def change_page(page):
+    """Button callback: move to another page of the listing"""
+    begin_action("page")
+    update_query(page=page if page > 1 else None)
+
+def on_listing_option_change(key, param, values=None):
+    """Sort/page-size callback: store the choice (mapped through values) in the URL and go back to page 1"""
+    begin_action(param)
+    value = st.session_state[key]
+    update_query(**{param: values[value] if values else value, 'page': None})
+
+def on_filter_change():
+    # New filters give a new result set, so start again from page 1
+    begin_action("filter")
+    update_query(page=None)
+
+def format_distance(km):
+    return "under 1 km" if km < 1 else f"{km:.0f} km"
+
+def render_listing_card(listing, distance=None):
+    """Compact card for the paginated listing; details load only when opened"""
+    with st.container(border=True):
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            st.markdown(image_html(listing.image_url, "thumb", alt=listing.title,
+                                   style="width:100%; height:auto; border-radius: 6px;"),
+                        unsafe_allow_html=True)
+        with col2:
+            facts = [f"📍 {listing.location}"]
+            if listing.price_text:
+                facts.append(f"💰 {listing.price_text}")
+            if listing.area_text:
+                facts.append(f"📏 {listing.area_text}")
+            if distance is not None:
+                facts.append(f"🧭 {format_distance(distance)} away")
+            st.markdown(f"**{listing.icon} {listing.title}**  \n" + " · ".join(facts))
+            button1, button2 = st.columns(2)
+            button1.button("View details", key=f"open_{listing.slug}",
+                           on_click=open_listing, args=(listing.slug,))
+            button2.button("Enquire Now", key=f"enquire_card_{listing.slug}",
+                           on_click=start_enquiry, args=(listing.display_name,))
+
+def render_nearby(catalog, listing):
+    """Nearest listings and similar ones close by, as links to their details"""
+    index = get_spatial_index(catalog)
+    position = catalog.positions[listing.slug]
+    point = index.point(position)
+    if point is None:
+        return
+    nearest, distances = index.nearest(*point, 5, exclude=position)
+    similar, similar_distances = similar_nearby(index, get_columns(catalog), position)
+    col1, col2 = st.columns(2)
+    for column, title, key, found, km in ((col1, "📍 Nearby", "nearby", nearest, distances),
+                                          (col2, "✨ Similar plots nearby", "similar", similar, similar_distances)):
+        with column:
+            st.markdown(f"**{title}**")
+            if not len(found):
+                st.caption("Nothing close by yet.")
+            for other, distance in zip(found.tolist(), km.tolist()):
+                item = catalog.listings[other]
+                st.button(f"{item.icon} {item.display_name} · {format_distance(distance)}",
+                          key=f"{key}_{item.slug}", on_click=open_listing, args=(item.slug,))
+
+def render_property(listing, catalog):
+    """Render a catalog listing's full details on the Properties tab"""
+    with st.expander(f"{listing.icon} {listing.display_name}", expanded=True):
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.markdown(image_html(listing.image_url, "column", alt=listing.title,
+                                   style="width:100%; height:auto;"), unsafe_allow_html=True)
+        with col2:
+            st.subheader(listing.title)
+            details = [f"- 📍 Location: {listing.location}, Himachal Pradesh"]
+            if listing.area_text:
+                details.append(f"- 📏 Area: {listing.area_text}")
+            if listing.price_text:
+                details.append(f"- 💰 Price: {listing.price_text}")
+            if listing.features:
+                details.append("- 🌟 Features: ")
+                details.extend(f"    - {feature}" for feature in listing.features)
+            st.markdown("\n".join(details))
+            st.button("Enquire Now", key=f"enquire_{listing.slug}",
+                      on_click=start_enquiry, args=(listing.display_name,))
+        render_nearby(catalog, listing)
+
+# Area slider stops in sq.ft.
+AREA_STOPS = [0, 1000, 2500, 5000, 10000, 21780, 43560, 108900, 217800, 435600, 871200, 2178000]
+
+def format_area(sqft):
+    """Human-readable area, in acres from one acre upwards"""
+    if sqft >= 43560:
+        return f"{sqft / 43560:g} acres"
+    return f"{sqft:,.0f} sq.ft."
+
+FEATURE_BY_LABEL = {label: name for name, (label, _) in FEATURE_FLAGS.items()}
+
+FILTER_KEYS = ("filter_search", "filter_budget", "filter_districts", "filter_area", "filter_features",
+               "filter_near", "filter_radius")
+
+ANYWHERE = "Anywhere"
+
+def near_options(contact):
+    """"Near" choices: our office (from OFFICE_ADDRESS) and every gazetteer town"""
+    options = {ANYWHERE: None}
+    office = find_town(contact['OFFICE_ADDRESS'])
+    if office:
+        options[f"Our office ({office})"] = GAZETTEER[office]
+    options.update((town, GAZETTEER[town]) for town in sorted(GAZETTEER))
+    return options
+
+def property_filters(columns, contact):
+    """Render the Properties search box and filter controls and return the resulting ListingQuery"""
+    text = st.text_input("Search", key="filter_search", placeholder="Try deodar, river, resort, gated...",
+                         on_change=on_filter_change)
+    with st.expander("🔎 Filter properties"):
+        col1, col2 = st.columns(2)
+        with col1:
+            _, highest = columns.price_bounds()
+            ceiling = max(1, math.ceil(highest / 1e5))
+            budget = st.slider("Budget (₹ Lakhs)", 0, ceiling, (0, ceiling), key="filter_budget",
+                               on_change=on_filter_change)
+            districts = st.multiselect("District", columns.districts, key="filter_districts",
+                                       on_change=on_filter_change)
+        with col2:
+            _, largest = columns.area_bounds()
+            # Labels as options: AppTest in the pinned Streamlit only round-trips plain strings
+            stops = {}
+            for stop in [stop for stop in AREA_STOPS if stop < largest] + [largest]:
+                stops.setdefault(format_area(stop), stop)
+            labels = list(stops)
+            low, high = st.select_slider("Area", options=labels, value=(labels[0], labels[-1]),
+                                         key="filter_area", on_change=on_filter_change)
+            area = (stops[low], stops[high])
+            features = st.multiselect("Features", list(FEATURE_BY_LABEL), key="filter_features",
+                                      on_change=on_filter_change)
+        places = near_options(contact)
+        col1, col2 = st.columns(2)
+        near = col1.selectbox("Near", list(places), key="filter_near", on_change=on_filter_change)
+        radius = col2.slider("Within (km)", 5, 150, 30, step=5, key="filter_radius",
+                             on_change=on_filter_change, disabled=places[near] is None)
     
-    # Initialize session state for navigation
-    if 'selected_tab' not in st.session_state:
-        st.session_state.selected_tab = "Home"
+    # A slider left at its full range doesn't filter, so unpriced listings still show
+    return ListingQuery(
+        price_min=budget[0] * 1e5 if budget[0] > 0 else None,
+        price_max=budget[1] * 1e5 if budget[1] < ceiling else None,
+        area_min=area[0] if low != labels[0] else None,
+        area_max=area[1] if high != labels[-1] else None,
+        districts=frozenset(districts),
+        features=frozenset(FEATURE_BY_LABEL[label] for label in features),
+        near=places[near],
+        radius_km=float(radius),
+        text=text.strip(),
+    )
+
+SORT_LABELS = {
+    "recommended": "Recommended",
+    "price_asc": "Price: low to high",
+    "price_desc": "Price: high to low",
+    "area_asc": "Area: small to large",
+    "area_desc": "Area: large to small",
+    "distance": "Distance",
+    "relevance": "Relevance",
+}
+SORT_BY_LABEL = {label: key for key, label in SORT_LABELS.items()}
+
+def render_listing_page(catalog, route, contact):
+    """Filters, sort/page-size controls and one page of compact listing cards"""
+    columns = get_columns(catalog)
+    query = property_filters(columns, contact)
+    # A search lists best matches first unless another order was chosen
+    default_sort = "relevance" if query.text else SORT_KEYS[0]
+    sort = route.sort if route.sort in SORT_KEYS else default_sort
+    within, rankings, distances = [], {}, {}
+    if query.near is not None:
+        nearby, km = get_spatial_index(catalog).within(*query.near, query.radius_km)
+        distances = dict(zip(nearby.tolist(), km.tolist()))
+        within.append(nearby)
+        rankings["distance"] = nearby
+    if query.text:
+        hits = get_search_index(catalog).search(query.text)
+        within.append(hits)
+        rankings["relevance"] = hits
+    matches = columns.select(query, sort, within, rankings)
     
-    # Update selected tab from URL if present
-    if 'tab' in st.query_params:
-        st.session_state.selected_tab = st.query_params['tab']
+    pages = max(1, math.ceil(len(matches) / route.page_size))
+    page = min(route.page, pages)
     
-    # Get contact info at the start of main
-    office_address = get_config('OFFICE_ADDRESS', 'Solan, By pass road, Near New Bus Stand, Himachal Pradesh')
-    contact_phone = get_config('CONTACT_PHONE', '+91 XXXXXXXXXX')
-    contact_email = get_config('CONTACT_EMAIL', 'contact@example.com')
-    website_url = get_config('WEBSITE_URL', 'sivachnitinkumar@gmail.com')
+    col1, col2, col3 = st.columns([2, 1, 1])
+    col1.caption(f"{len(matches)} properties · page {page} of {pages}")
+    # Keep the widgets in sync with the URL (deep links, back/forward)
+    st.session_state.listing_sort = SORT_LABELS[sort]
+    st.session_state.listing_per_page = route.page_size
+    col2.selectbox("Sort by", list(SORT_BY_LABEL), key="listing_sort",
+                   on_change=on_listing_option_change, args=("listing_sort", "sort", SORT_BY_LABEL))
+    col3.selectbox("Per page", PAGE_SIZES, key="listing_per_page",
+                   on_change=on_listing_option_change, args=("listing_per_page", "per_page"))
     
-    # Initialize session state
-    if 'form_submitted' not in st.session_state:
-        st.session_state.form_submitted = False
-    if 'enquiry_property' not in st.session_state:
-        st.session_state.enquiry_property = None
-    if 'contact_expanded' not in st.session_state:
-        st.session_state.contact_expanded = False
+    if not len(matches):
+        st.info("No properties match your filters.")
+    start = (page - 1) * route.page_size
+    for index in matches[start:start + route.page_size]:
+        render_listing_card(catalog.listings[index], distances.get(int(index)))
     
-    # Handle URL parameters
-    if 'enquire' in st.query_params and st.query_params['enquire'] == 'true':
-        st.session_state.contact_expanded = True
-        st.session_state.form_submitted = False
-        if 'property' in st.query_params:
-            st.session_state.enquiry_property = st.query_params['property']
+    if pages > 1:
+        prev_col, _, next_col = st.columns([1, 4, 1])
+        prev_col.button("◀ Previous", disabled=page <= 1, on_click=change_page, args=(page - 1,))
+        next_col.button("Next ▶", disabled=page >= pages, on_click=change_page, args=(page + 1,))
+
+# Market Insights units: rate multiplier and histogram label column
+MARKET_UNITS = {"per sq.ft.": (1.0, "band_sqft"), "per acre": (SQFT_PER_ACRE, "band_acre")}
+
+def render_market(catalog):
+    """Market Insights: price levels, distribution and trend per district, from the cached rollups"""
+    view = get_market_view(catalog)
+    st.caption("Asking prices of the listings on the market now. Medians are accurate to about 2%.")
+    st.dataframe(view.summary, use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        district = st.selectbox("District", view.districts, key="market_district",
+                                index=view.districts.index(ALL_DISTRICTS))
+        unit = st.radio("Rates", list(MARKET_UNITS), key="market_unit", horizontal=True)
+        scale, band = MARKET_UNITS[unit]
+        latest, year_ago = view.changes[district]
+        if latest is not None:
+            delta = f"{(latest / year_ago - 1) * 100:+.1f}% on a year ago" if year_ago else None
+            st.metric(f"Median asking rate, last 3 months ({unit})", format_rupees(latest * scale), delta)
+    with col2:
+        st.subheader("Price distribution")
+        st.vega_lite_chart(view.histograms[district], {
+            "mark": {"type": "bar", "color": "#1e3c72"},
+            "encoding": {
+                "x": {"field": band, "type": "ordinal", "sort": None, "title": f"₹ {unit}"},
+                "y": {"field": "listings", "type": "quantitative", "title": "Listings"},
+            },
+        }, use_container_width=True)
+    st.subheader(f"Median asking rate by month (₹ {unit})")
+    trend = view.trends[[district]].dropna()
+    if len(trend) > 1:
+        st.line_chart(trend * scale)
+    else:
+        st.info("The trend appears once listings span more than one month.")
+
+def render_diagnostics():
+    """Hidden admin page: counters, latency histograms and this session's runs"""
+    st.header("🩺 Diagnostics")
+    if not metrics.enabled():
+        st.warning("Metrics are disabled. Set METRICS_ENABLED=true to collect them.")
+        return
+    data = metrics.snapshot()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Counters")
+        st.dataframe([{"name": name, "value": value} for name, value in sorted(data["counters"].items())],
+                     use_container_width=True, hide_index=True)
+        st.subheader("Caches and outbox")
+        st.dataframe([{"name": name, "value": value} for name, value in sorted(data["gauges"].items())],
+                     use_container_width=True, hide_index=True)
+    with col2:
+        st.subheader("Latency (ms)")
+        rows = []
+        for name, summary in sorted(data["histograms"].items()):
+            row = {"name": name, "count": summary["count"]}
+            for q in ("p50", "p95", "p99"):
+                row[q] = round(summary[q] * 1000, 2) if summary[q] is not None else None
+            rows.append(row)
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.subheader("This session")
+        st.json(rerun_stats())
+    with st.expander("Prometheus text"):
+        st.code(metrics.prometheus_text(data), language="text")
+
+def main():
+    metrics.refresh()
+    # Load CSS
+    load_css()
+    catalog = get_catalog()
+    
+    count_run()
+    start_notification_retry(config_version())
+    route = parse_route()
+    
+    # Get contact info once per rerun from the cached config snapshot
+    with metrics.timer("config_load"):
+        contact = contact_info(get_snapshot())
     
     # Navigation
     with st.container():
-        # Create a callback to update the URL when a tab is selected
-        def on_tab_change(*args):
-            st.query_params.clear()
-            st.query_params['tab'] = st.session_state.nav_menu
-            st.session_state.selected_tab = st.session_state.nav_menu
-        
-        # Get the selected tab from session state
-        selected = st.session_state.selected_tab
-        
-        # Create the navigation menu
-        selected = option_menu(
+        # The route decides the page; the menu only reports clicks via on_change
+        option_menu(
             menu_title=None,
-            options=["Home", "Properties", "About", "Contact"],
-            icons=["house", "map", "info-circle", "envelope"],
+            options=list(TABS),
+            icons=["house", "map", "graph-up", "info-circle", "envelope"],
             menu_icon="cast",
-            default_index=["Home", "Properties", "About", "Contact"].index(selected) if selected in ["Home", "Properties", "About", "Contact"] else 0,
+            default_index=route.tab_index,
             orientation="horizontal",
             styles={
                 "container": {"padding": "0!important", "background-color": "#f8f9fa"},
                 "nav-link": {"font-size": "16px", "text-align": "center", "margin":"0px", "--hover-color": "#eee"},
                 "nav-link-selected": {"background-color": "#1e3c72"},
             },
-            key="nav_menu",
+            key=menu_key(),
             on_change=on_tab_change
         )
-        
-        # Override selection if coming from enquiry
-        if st.session_state.contact_expanded:
-            selected = "Contact"
-            st.session_state.selected_tab = "Contact"
-            st.query_params.clear()
-            st.query_params['tab'] = "Contact"
+        selected = route.tab
     
-    # Home Section
-    if selected == "Home":
-        st.markdown("""
-        <div class="header">
-            <h1>Himachal Land Deals</h1>
-            <p>Your Trusted Partner for Premium Land Deals in Himachal Pradesh</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("""
-        ## Welcome to Himachal Land Deals
-        
-        Discover the most beautiful and valuable land properties in the serene landscapes of Himachal Pradesh. 
-        Whether you're looking for a peaceful retreat, an investment opportunity, or your dream home location, 
-        we have the perfect piece of land for you.
-        """)
+    page = "Diagnostics" if route.diagnostics else selected
+    with metrics.timer(f"render.{page}"):
+        if route.diagnostics:
+            render_diagnostics()
+            
+        # Home Section
+        elif selected == "Home":
+            st.markdown(HOME_HEADER, unsafe_allow_html=True)
+            st.markdown(HOME_WELCOME)
+            
+            # Featured Properties
+            st.header("✨ Featured Properties")
+            st.markdown(fragment("featured", lambda: featured_grid_html(catalog.featured),
+                                 catalog_version=catalog.version, key=derivatives_version()),
+                        unsafe_allow_html=True)
         
-        # Featured Properties
-        st.header("✨ Featured Properties")
-        col1, col2 = st.columns(2)
+        # Properties Section
+        elif selected == "Properties":
+            st.header("🏞️ Available Properties")
+            
+            listing = catalog.get(route.listing) if route.listing else None
+            if listing is not None:
+                # Filter widgets aren't rendered here; keep their values for the way back
+                for key in FILTER_KEYS:
+                    if key in st.session_state:
+                        st.session_state[key] = st.session_state[key]
+                st.button("← Back to all properties", on_click=open_listing, args=(None,))
+                render_property(listing, catalog)
+            else:
+                render_listing_page(catalog, route, contact)
         
-        with col1:
-            with st.container():
-                st.markdown("""
-                <div class="property-card">
-                    <img src="https://images.unsplash.com/photo-1600585154340-be6161a56a0c?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80" 
-                         style="width:100%; height:200px; object-fit: cover;">
-                    <div style="padding: 1rem;">
-                        <h3>Mountain View Plots</h3>
-                        <p>📍 Shimla, Himachal Pradesh</p>
-                        <p>Starting from ₹25 Lakhs</p>
-                        <p>Panoramic mountain views, gated community, 24/7 security</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+        # Market Insights Section
+        elif selected == "Market Insights":
+            st.header("📈 Market Insights")
+            render_market(catalog)
         
-        with col2:
-            with st.container():
-                st.markdown("""
-                <div class="property-card">
-                    <img src="https://images.unsplash.com/photo-1600607687939-ce8a6c25118c?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80" 
-                         style="width:100%; height:200px; object-fit: cover;">
-                    <div style="padding: 1rem;">
-                        <h3>Riverside Land Parcels</h3>
-                        <p>📍 Kullu, Himachal Pradesh</p>
-                        <p>Starting from ₹35 Lakhs</p>
-                        <p>Adjacent to river, lush green surroundings, peaceful environment</p>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-    
-    # Properties Section
-    elif selected == "Properties":
-        st.header("🏞️ Available Properties")
-        
-        # Property 1
-        with st.expander("🌄 Premium Hilltop Land - Shimla", expanded=True):
+        # About Section
+        elif selected == "About":
+            st.header("🏔️ About Us")
+            
             col1, col2 = st.columns([1, 2])
+            
             with col1:
-                st.image("https://images.unsplash.com/photo-1580587771525-78b9dba3b914?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80", 
-                        use_container_width=True)
+                st.markdown(fragment("about_image", about_image_html, key=derivatives_version()),
+                            unsafe_allow_html=True)
+            
             with col2:
-                st.subheader("Premium Hilltop Land")
-                st.markdown("""
-                - 📍 Location: Shimla, Himachal Pradesh
-                - 📏 Area: 5-10 Acres available
-                - 💰 Price: ₹30 Lakhs - ₹50 Lakhs per acre
-                - 🌟 Features: 
-                    - Breathtaking valley views
-                    - All-weather road connectivity
-                    - Clear titles with proper documentation
-                    - Ideal for resort or farmhouse
-                """)
-                if st.button("Enquire Now", key="property1"):
-                    st.session_state.contact_expanded = True
-                    st.session_state.enquiry_property = "Premium Hilltop Land - Shimla"
-                    st.session_state.form_submitted = False
-                    st.query_params.clear()
-                    st.query_params['enquire'] = 'true'
-                    st.query_params['property'] = "Premium Hilltop Land - Shimla"
-                    st.query_params['tab'] = 'Contact'
-                    st.rerun()
+                st.markdown(ABOUT_STORY)
         
-        # Property 2
-        with st.expander("🌲 Forest Facing Plots - Manali", expanded=True):
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                st.image("https://images.unsplash.com/photo-1600566752225-7a0c8b5c1b5f?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80", 
-                        use_container_width=True)
-            with col2:
-                st.subheader("Forest Facing Plots")
+        # Contact Section
+        elif selected == "Contact":
+            if st.session_state.get('form_submitted', False):
+                # Show thank you message
+                st.balloons()
+                st.header("🎉 Thank You!")
                 st.markdown("""
-                - 📍 Location: Manali, Himachal Pradesh
-                - 📏 Area: 2400-5000 sq.ft. plots
-                - 💰 Price: ₹2000-₹2500 per sq.ft.
-                - 🌟 Features: 
-                    - Dense deodar forest view
-                    - Gated community
-                    - Water and electricity connections
-                    - 10 minutes from Manali Mall Road
-                """)
-                if st.button("Enquire Now", key="property2"):
-                    st.session_state.contact_expanded = True
-                    st.session_state.enquiry_property = "Forest Facing Plots - Manali"
-                    st.session_state.form_submitted = False
-                    st.query_params.clear()
-                    st.query_params['enquire'] = 'true'
-                    st.query_params['property'] = "Forest Facing Plots - Manali"
-                    st.query_params['tab'] = 'Contact'
-                    st.rerun()
-    
-    # About Section
-    elif selected == "About":
-        st.header("🏔️ About Us")
-        
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            st.image("https://images.unsplash.com/photo-1501785888041-af3ef285b470?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80", 
-                    use_container_width=True)
-        
-        with col2:
-            st.markdown("""
-            ## Our Story
-            
-            Established in 2010, Himachal Land Deals has been a trusted name in the real estate sector of Himachal Pradesh. 
-            With over a decade of experience, we have helped hundreds of clients find their dream properties in the lap of the Himalayas.
-            
-            ### Why Choose Us?
-            - 🏆 12+ Years of Experience
-            - 📜 Verified and Clear Titles
-            - 🏡 500+ Happy Clients
-            - 🏢 50+ Successful Projects
-            - 🤝 Transparent Deals
-            
-            Our team of local experts has in-depth knowledge of the region's real estate market, ensuring you get the best deals 
-            with complete transparency and legal compliance.
-            """)
-    
-    # Contact Section
-    elif selected == "Contact" or st.session_state.get('contact_expanded', False) or st.session_state.get('form_submitted', False):
-        # Reset the contact_expanded flag after loading the contact section
-        st.session_state.contact_expanded = False
-        
-        if st.session_state.get('form_submitted', False):
-            # Show thank you message
-            st.balloons()
-            st.header("🎉 Thank You!")
-            st.markdown("""
-            <div style='text-align: center; padding: 2rem; background-color: #f0f2f6; border-radius: 10px; margin: 2rem 0;'>
-                <h2>Your Enquiry Has Been Received!</h2>
-                <p>We've received your enquiry about <strong>{}</strong>.</p>
-                <p>Our team will contact you shortly at the provided contact details.</p>
-                <p style='margin-top: 2rem;'>
-                    <a href='/?nav=Home' class='stButton'>
-                        <button style='background-color: #1e3c72; color: white; border: none; padding: 0.5rem 1rem; border-radius: 5px; cursor: pointer;'>
-                            Back to Home
-                        </button>
-                    </a>
-                </p>
-            </div>
-            """.format(st.session_state.enquiry_property or 'our properties'), unsafe_allow_html=True)
-            
-            # Reset form state after showing thank you
-            if st.button("Submit Another Enquiry"):
-                st.session_state.form_submitted = False
-                st.session_state.enquiry_property = None
-                st.rerun()
-                
-        else:
-            st.header("📞 Contact Us")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("Get in Touch")
-                st.markdown(f"""
-                ### Office Address
-                📍 {office_address}
+                <div style='text-align: center; padding: 2rem; background-color: #f0f2f6; border-radius: 10px; margin: 2rem 0;'>
+                    <h2>Your Enquiry Has Been Received!</h2>
+                    <p>We've received your enquiry about <strong>{}</strong>.</p>
+                    <p>Our team will contact you shortly at the provided contact details.</p>
+                    <p style='margin-top: 2rem;'>
+                        <a href='/?tab=Home' class='stButton'>
+                            <button style='background-color: #1e3c72; color: white; border: none; padding: 0.5rem 1rem; border-radius: 5px; cursor: pointer;'>
+                                Back to Home
+                            </button>
+                        </a>
+                    </p>
+                </div>
+                """.format(escape(st.session_state.enquiry_property or 'our properties')), unsafe_allow_html=True)
                 
-                ### Contact Information
-                📞 {contact_phone}
-                📧 {contact_email}
-                🌐 {website_url}
+                # Reset form state after showing thank you
+                st.button("Submit Another Enquiry", on_click=reset_contact_form)
+                    
+            else:
+                st.header("📞 Contact Us")
                 
-                ### Office Hours
-                🕘 Monday - Saturday: 9:00 AM - 6:00 PM  
-                🚪 Sunday: Closed
-                """)
+                col1, col2 = st.columns(2)
                 
-                # Social Media Links
-                st.markdown("### Follow Us")
-                st.markdown("""
-                [![Facebook](https://img.icons8.com/color/48/000000/facebook-new.png)](https://facebook.com)
-                [![Instagram](https://img.icons8.com/color/48/000000/instagram-new.png)](https://instagram.com)
-                [![Twitter](https://img.icons8.com/color/48/000000/twitter.png)](https://twitter.com)
-                [![LinkedIn](https://img.icons8.com/color/48/000000/linkedin.png)](https://linkedin.com)
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                with st.form("contact_form"):
-                    st.subheader("Send us a Message")
-                    
-                    # Pre-fill property name if coming from an enquiry
-                    property_name = st.session_state.enquiry_property or ""
-                    if property_name:
-                        st.info(f"Enquiring about: {property_name}")
+                with col1:
+                    st.subheader("Get in Touch")
+                    st.markdown(fragment("contact_details", lambda: contact_details_markdown(contact)))
                     
-                    name = st.text_input("Your Name*")
-                    email = st.text_input("Email Address*")
-                    phone = st.text_input("Phone Number*")
-                    subject = st.selectbox("Subject", 
-                                        ["General Inquiry", "Property Inquiry", "Appointment Request", "Other"])
-                    message = st.text_area("Your Message*", height=150, 
-                                         value=f"I'm interested in {property_name}. " if property_name else "")
-                    
-                    # Form submission
-                    submitted = st.form_submit_button("Send Message")
-                    if submitted:
-                        if not all([name, email, phone, message]):
-                            st.error("Please fill in all required fields.")
-                        elif not validate_email(email):
-                            st.error("Please enter a valid email address.")
-                        elif not validate_phone(phone):
-                            st.error("Please enter a valid 10-digit Indian phone number.")
-                        else:
-                            # Send email
-                            email_sent = send_email(
-                                name=name,
-                                email=email,
-                                phone=phone,
-                                message=message,
-                                property_name=property_name or "General Enquiry"
-                            )
-                            
-                            if email_sent:
-                                st.session_state.form_submitted = True
-                                st.session_state.enquiry_property = property_name
-                                st.rerun()
-                            else:
-                                st.error("Failed to send your message. Please try again later or contact us directly.")
-    
-    # Get contact info
-    office_address = get_config('OFFICE_ADDRESS', 'Solan, By pass road, Near New Bus Stand, Himachal Pradesh')
-    contact_phone = get_config('CONTACT_PHONE', '+91 XXXXXXXXXX')
-    contact_email = get_config('CONTACT_EMAIL', 'contact@example.com')
-    website_url = get_config('WEBSITE_URL', 'www.himachallanddeals.com')
+                    # Social Media Links
+                    st.markdown("### Follow Us")
+                    st.markdown(social_links_html(), unsafe_allow_html=True)
+                
+                with col2:
+                    with st.form("contact_form"):
+                        st.subheader("Send us a Message")
+                        
+                        # Pre-fill property name if coming from an enquiry
+                        property_name = st.session_state.enquiry_property or ""
+                        if property_name:
+                            st.info(f"Enquiring about: {property_name}")
+                        if 'contact_message' not in st.session_state:
+                            st.session_state.contact_message = ""
+                        
+                        st.text_input("Your Name*", key="contact_name")
+                        st.text_input("Email Address*", key="contact_email")
+                        st.text_input("Phone Number*", key="contact_phone")
+                        st.selectbox("Subject", 
+                                     ["General Inquiry", "Property Inquiry", "Appointment Request", "Other"],
+                                     key="contact_subject")
+                        st.text_area("Your Message*", height=150, key="contact_message")
+                        
+                        # Validation and submission run in the callback, before this render
+                        st.form_submit_button("Send Message", on_click=submit_contact_form)
+                        if 'contact_error' in st.session_state:
+                            st.error(st.session_state.pop('contact_error'))
     
     # Footer
-    st.markdown(f"""
-    <div class="footer">
-        <p>© 2025 Himachal Land Deals. All Rights Reserved.</p>
-        <p>📍 {office_address}</p>
-        <p>📞 {contact_phone} | ✉️ {contact_email} | 🌐 {website_url}</p>
-        <p>Designed with ❤️ by Himachal Land Deals</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(fragment("footer", lambda: footer_html(contact)), unsafe_allow_html=True)
 
 if __name__ == "__main__":
     main()
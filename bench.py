@@ -0,0 +1,565 @@
+"""Headless benchmarks: scripted visitor journeys through app.py using AppTest.
+
+    python bench.py                        # run and print the report
+    python bench.py --sessions 20          # more simulated sessions
+    python bench.py --save-baseline        # store the numbers in bench_baseline.json
+    python bench.py --check                # exit 1 if worse than the baseline
+    python bench.py --startup              # cold start: import times and first render
+
+Notifications go to an in-process fake SMTP server. The catalog, enquiry
+log, search index and image caches live in a temporary directory, and the
+listing photos are generated locally rather than downloaded, so a run
+touches nothing real.
+
+Sessions run one after another in this process, not concurrently, so the
+throughput figures are for a single visitor at a time.
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+APP = ROOT / "app.py"
+DEFAULT_BASELINE = ROOT / "bench_baseline.json"
+
+SMTP_USER = "bench@example.com"
+SMTP_PASSWORD = "bench-password"
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def readline(self):
+        return self.rfile.readline().decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self):
+        self.reply("220 bench.local ESMTP")
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-bench.local")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                self.auth(arg)
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (line := self.readline()) != ".":
+                    lines.append(line)
+                self.server.messages.append("\n".join(lines))
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def auth(self, arg):
+        mechanism, _, initial = arg.partition(" ")
+        if mechanism.upper() == "PLAIN":
+            if not initial:
+                self.reply("334 ")
+                initial = self.readline()
+            _, user, password = base64.b64decode(initial).decode().split("\0")
+        elif mechanism.upper() == "LOGIN":
+            self.reply("334 " + base64.b64encode(b"Username:").decode())
+            user = base64.b64decode(self.readline()).decode()
+            self.reply("334 " + base64.b64encode(b"Password:").decode())
+            password = base64.b64decode(self.readline()).decode()
+        else:
+            self.reply("504 Unrecognized authentication type")
+            return
+        if (user, password) == (self.server.username, self.server.password):
+            self.reply("235 Authentication successful")
+        else:
+            self.reply("535 Authentication credentials invalid")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP server on a free localhost port that keeps every message it accepts"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, username=SMTP_USER, password=SMTP_PASSWORD):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.username = username
+        self.password = password
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def configure(workdir, smtp_port, notify_mode="immediate"):
+    """Point the app at throwaway stores and the fake SMTP server (before it is imported)"""
+    os.environ.update({
+        'CATALOG_DB': str(workdir / "catalog.db"),
+        'ENQUIRY_DB': str(workdir / "enquiries.db"),
+        'SEARCH_DB': str(workdir / "search.db"),
+        'IMAGE_CACHE_DIR': str(workdir / "img"),
+        'IMAGE_SOURCE_DIR': str(workdir / "images"),
+        'EMAIL_HOST_USER': SMTP_USER,
+        'EMAIL_HOST_PASSWORD': SMTP_PASSWORD,
+        'RECIPIENT_EMAIL': "sales@example.com",
+        'SMTP_HOST': "127.0.0.1",
+        'SMTP_PORT': str(smtp_port),
+        'SMTP_STARTTLS': "false",
+        'SMTP_MAX_RETRIES': "0",
+        'ENQUIRY_BURST': "1000000",
+        'METRICS_ENABLED': "false",
+        'NOTIFY_MODE': notify_mode,
+        'NOTIFY_DIGEST_WINDOW': "3600",
+        'LEAD_RESOLVER': "stub",
+    })
+
+
+def seed_images():
+    """Store a generated photo for every image the pages show, so none is downloaded"""
+    import io
+
+    from PIL import Image
+
+    from catalog import get_catalog
+    from images import ingest
+    from markup import ABOUT_IMAGE_URL
+    urls = [listing.image_url for listing in get_catalog().listings] + [ABOUT_IMAGE_URL]
+    for number, url in enumerate(dict.fromkeys(urls)):
+        buffer = io.BytesIO()
+        Image.new("RGB", (1000, 667), (40 + number * 23 % 200, 90, 60)).save(buffer, "JPEG", quality=90)
+        ingest(url, buffer.getvalue())
+
+
+class Session:
+    """One simulated visitor; every step is one interaction and its script run(s)"""
+
+    def __init__(self, number, timeout=30):
+        from streamlit.testing.v1 import AppTest
+        self.number = number
+        self.at = AppTest.from_file(str(APP), default_timeout=timeout)
+        self.steps = []
+
+    def runs(self):
+        # Script runs so far, as counted by the app itself (routing.count_run)
+        if "_run_stats" not in self.at.session_state:
+            return 0
+        stats = self.at.session_state["_run_stats"]
+        return stats['runs'] + sum(runs for _, runs in stats['history'])
+
+    def step(self, name, action):
+        before = self.runs()
+        started = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - started
+        if self.at.exception:
+            raise RuntimeError(f"{name}: {self.at.exception[0].value}")
+        self.steps.append((name, elapsed, self.runs() - before))
+
+    def headers(self):
+        return [header.value for header in self.at.header]
+
+    def buttons(self, label):
+        return [button for button in self.at.button if button.label == label]
+
+    def open(self, tab=None):
+        if tab:
+            self.at.query_params["tab"] = tab
+        self.step(f"land:{tab or 'Home'}", self.at.run)
+
+    def menu(self, tab):
+        """Click a tab in the option_menu component, as the browser would report it.
+
+        AppTest (Streamlit 1.32) has no public way to set a custom component's
+        value, so this builds the widget states itself and reruns through the
+        private AppTest._tree and AppTest._run; check it on Streamlit upgrades.
+        """
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+        menus = [element for element in self.at.get("component_instance") if "-nav_menu_" in element.proto.id]
+        states = WidgetStates()
+        states.CopyFrom(self.at._tree.get_widget_states())
+        widget = states.widgets.add()
+        widget.id = menus[0].proto.id
+        widget.json_value = json.dumps(tab)
+        self.step(f"menu:{tab}", lambda: self.at._run(states))
+
+    def click(self, name, button):
+        self.step(name, lambda: button.click().run())
+
+    def fill_contact(self, name="", email="", phone="", message=None):
+        self.at.text_input(key="contact_name").input(name)
+        self.at.text_input(key="contact_email").input(email)
+        self.at.text_input(key="contact_phone").input(phone)
+        if message is not None:
+            self.at.text_area(key="contact_message").input(message)
+
+    def submit(self, name):
+        self.click(name, self.buttons("Send Message")[0])
+
+    def errors(self):
+        return [error.value for error in self.at.error]
+
+
+def journey_browse(session):
+    """Land on Home and visit every tab through the menu"""
+    session.open()
+    for tab in ("Properties", "Market Insights", "About", "Contact", "Home"):
+        session.menu(tab)
+        assert session.at.session_state["selected_tab"] == tab, f"menu did not switch to {tab}"
+
+
+def journey_enquire_each(session):
+    """From the Properties tab, click every listing's Enquire Now in turn"""
+    session.open("Properties")
+    count = len(session.buttons("Enquire Now"))
+    for index in range(count):
+        if index:
+            session.menu("Properties")
+        session.click("enquire", session.buttons("Enquire Now")[index])
+        assert "📞 Contact Us" in session.headers(), "Enquire Now did not open the contact form"
+        assert session.at.text_area(key="contact_message").value.startswith("I'm interested in")
+
+
+def journey_validation(session):
+    """Submit the contact form with missing and malformed fields"""
+    session.open("Contact")
+    session.submit("submit:empty")
+    assert session.errors() == ["Please fill in all required fields."], session.errors()
+    session.fill_contact("Asha", "not-an-email", "9876543210", "Hello")
+    session.submit("submit:bad_email")
+    assert session.errors() == ["Please enter a valid email address."], session.errors()
+    session.fill_contact("Asha", "asha@example.com", "12345")
+    session.submit("submit:bad_phone")
+    assert session.errors() == ["Please enter a valid 10-digit Indian phone number."], session.errors()
+
+
+def journey_contact(session):
+    """Enquire about a listing and send the contact form"""
+    session.open("Properties")
+    session.click("enquire", session.buttons("Enquire Now")[0])
+    session.fill_contact(f"Visitor {session.number}", f"visitor{session.number}@example.com",
+                         f"9{session.number:09d}")
+    session.submit("submit:valid")
+    assert "🎉 Thank You!" in session.headers(), session.errors()
+
+
+JOURNEYS = {
+    'browse': journey_browse,
+    'enquire_each': journey_enquire_each,
+    'validation': journey_validation,
+    'contact': journey_contact,
+}
+
+
+def run_journey(name, number):
+    session = Session(number)
+    JOURNEYS[name](session)
+    return session.steps
+
+
+def enquiries_notified(messages):
+    """Visitor numbers named in delivered emails, whether single or digest"""
+    from email import message_from_string, policy
+    visitors = set()
+    for raw in messages:
+        body = message_from_string(raw, policy=policy.default).get_body().get_content()
+        visitors.update(re.findall(r"Visitor (\d+)", body))
+    return visitors
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def benchmark(sessions, smtp):
+    """Run every journey `sessions` times and summarise latency, runs, memory and throughput.
+
+    Sessions are run sequentially, each in its own AppTest.
+    """
+    from leads import get_lead_checker
+    from notify import get_notifier
+    from outbox import get_outbox
+
+    # One untimed pass warms imports, caches and image fallbacks
+    for name in JOURNEYS:
+        run_journey(name, 0)
+    get_lead_checker().drain(timeout=30)
+    get_notifier().flush()
+    get_outbox().flush(timeout=30)
+    sent_before = len(smtp.messages)
+
+    steps = {}
+    journeys = {}
+    started = time.perf_counter()
+    for number in range(1, sessions + 1):
+        for name in JOURNEYS:
+            journey_started = time.perf_counter()
+            recorded = run_journey(name, number)
+            journey = journeys.setdefault(name, {'seconds': [], 'runs': [], 'steps': len(recorded)})
+            journey['seconds'].append(time.perf_counter() - journey_started)
+            journey['runs'].append(sum(runs for _, _, runs in recorded))
+            for step, elapsed, runs in recorded:
+                entry = steps.setdefault(f"{name}/{step}", {'seconds': [], 'runs': []})
+                entry['seconds'].append(elapsed)
+                entry['runs'].append(runs)
+    elapsed = time.perf_counter() - started
+    # A digest still waiting for its window is sent now, as on shutdown
+    get_lead_checker().drain(timeout=30)
+    get_notifier().flush()
+    drained = get_outbox().flush(timeout=30)
+    messages = smtp.messages[sent_before:]
+
+    memory = {}
+    for name in JOURNEYS:
+        tracemalloc.start()
+        run_journey(name, sessions + 1)
+        memory[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'sessions': sessions,
+        'python': sys.version.split()[0],
+        'steps': {
+            name: {
+                'p50_ms': statistics.median(entry['seconds']) * 1000,
+                'p95_ms': percentile(entry['seconds'], 0.95) * 1000,
+                'runs': max(entry['runs']),
+            }
+            for name, entry in sorted(steps.items())
+        },
+        'journeys': {
+            name: {
+                'steps': entry['steps'],
+                'runs': max(entry['runs']),
+                'p50_ms': statistics.median(entry['seconds']) * 1000,
+                'peak_kib': memory[name] / 1024,
+            }
+            for name, entry in journeys.items()
+        },
+        'throughput': {
+            'sessions_per_s': sessions / elapsed,
+            'runs_per_s': sum(sum(entry['runs']) for entry in journeys.values()) / elapsed,
+        },
+        'emails': {
+            'mode': os.environ['NOTIFY_MODE'],
+            'enquiries': sessions,
+            'notified': len(enquiries_notified(messages)),
+            'sent': len(messages),
+            'drained': drained,
+        },
+    }
+
+
+# Modules whose first import is reported by --startup; the third-party ones
+# should only load once a page needs them
+STARTUP_MODULES = (
+    "streamlit", "streamlit_option_menu", "config", "metrics", "enquiries", "catalog", "parsing",
+    "routing", "images", "fragments", "markup", "filters", "outbox",
+    "numpy", "PIL.Image", "requests", "smtplib", "email.mime.multipart", "dotenv", "sqlite3",
+)
+
+# Runs in a fresh interpreter: render the landing page once, then rerun it
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+root, app, modules = sys.argv[1], sys.argv[2], sys.argv[3].split(",")
+sys.path.insert(0, root)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(app, default_timeout=60)
+at.run()
+rendered = time.perf_counter()
+wall = time.time()
+at.run()
+print(json.dumps({
+    "wall": wall,
+    "first_render_s": rendered - started,
+    "rerun_s": time.perf_counter() - rendered,
+    "error": at.exception[0].value if at.exception else None,
+    "loaded": [name for name in modules if name in sys.modules],
+}))
+"""
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def startup(repeats):
+    """Cold-start figures over `repeats` fresh processes (median of each)"""
+    imports = {}
+    first_render, spawn_to_render, rerun, loaded = [], [], [], set()
+    for _ in range(repeats):
+        spawned = time.time()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE, str(ROOT), str(APP), ",".join(STARTUP_MODULES)],
+            capture_output=True, text=True, timeout=300,
+        )
+        if proc.returncode:
+            raise RuntimeError(f"startup probe failed:\n{proc.stderr[-2000:]}")
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        if probe['error']:
+            raise RuntimeError(f"startup probe: {probe['error']}")
+        for line in proc.stderr.splitlines():
+            match = _IMPORT_TIME.match(line)
+            if match and match.group(4) in STARTUP_MODULES:
+                imports.setdefault(match.group(4), []).append(int(match.group(2)) / 1000)
+        first_render.append(probe['first_render_s'] * 1000)
+        spawn_to_render.append((probe['wall'] - spawned) * 1000)
+        rerun.append(probe['rerun_s'] * 1000)
+        loaded.update(probe['loaded'])
+    return {
+        'repeats': repeats,
+        'imports_ms': {name: statistics.median(imports[name]) for name in STARTUP_MODULES if name in imports},
+        'first_render_ms': statistics.median(first_render),
+        'spawn_to_render_ms': statistics.median(spawn_to_render),
+        'rerun_ms': statistics.median(rerun),
+        'loaded_by_first_render': [name for name in STARTUP_MODULES if name in loaded],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline, as human-readable lines"""
+    problems = []
+    slack = 1 + tolerance
+    if 'startup' in results and 'startup' in baseline:
+        for key in ('first_render_ms', 'spawn_to_render_ms'):
+            now, base = results['startup'][key], baseline['startup'][key]
+            if now > base * slack:
+                problems.append(f"startup {key}: {now:.0f} ms > {base:.0f} ms")
+        newly_loaded = set(results['startup']['loaded_by_first_render']) - set(baseline['startup']['loaded_by_first_render'])
+        if newly_loaded:
+            problems.append(f"startup now imports {', '.join(sorted(newly_loaded))} before the first render")
+    if 'steps' not in results or 'steps' not in baseline:
+        return problems
+    for name, step in results['steps'].items():
+        base = baseline['steps'].get(name)
+        if base is None:
+            continue
+        if step['p95_ms'] > base['p95_ms'] * slack:
+            problems.append(f"{name}: p95 {step['p95_ms']:.1f} ms > {base['p95_ms']:.1f} ms")
+        if step['runs'] > base['runs']:
+            problems.append(f"{name}: {step['runs']} script runs > {base['runs']}")
+    for name, journey in results['journeys'].items():
+        base = baseline['journeys'].get(name)
+        if base is None:
+            continue
+        if journey['runs'] > base['runs']:
+            problems.append(f"{name}: {journey['runs']} script runs per journey > {base['runs']}")
+        if journey['peak_kib'] > base['peak_kib'] * slack:
+            problems.append(f"{name}: peak memory {journey['peak_kib']:.0f} KiB > {base['peak_kib']:.0f} KiB")
+    base = baseline['throughput']['sessions_per_s']
+    if results['throughput']['sessions_per_s'] * slack < base:
+        problems.append(f"throughput {results['throughput']['sessions_per_s']:.2f} sessions/s < {base:.2f}")
+    emails = results['emails']
+    if emails['notified'] != emails['enquiries']:
+        problems.append(f"{emails['notified']} of {emails['enquiries']} enquiries notified")
+    return problems
+
+
+def startup_report(results):
+    lines = [f"{'module (first import)':<36}{'ms':>10}"]
+    for name, ms in results['imports_ms'].items():
+        lines.append(f"{name:<36}{ms:>10.1f}")
+    lines += [
+        "",
+        f"first render, in process:        {results['first_render_ms']:.0f} ms",
+        f"first render, from process spawn: {results['spawn_to_render_ms']:.0f} ms",
+        f"warm rerun:                       {results['rerun_ms']:.0f} ms",
+        "loaded by the first render: " + ", ".join(results['loaded_by_first_render']),
+    ]
+    return "\n".join(lines)
+
+
+def report(results):
+    lines = [f"{'step':<36}{'p50 ms':>10}{'p95 ms':>10}{'runs':>6}"]
+    for name, step in results['steps'].items():
+        lines.append(f"{name:<36}{step['p50_ms']:>10.1f}{step['p95_ms']:>10.1f}{step['runs']:>6}")
+    lines += ["", f"{'journey':<36}{'steps':>10}{'runs':>10}{'p50 ms':>10}{'peak KiB':>10}"]
+    for name, journey in results['journeys'].items():
+        lines.append(f"{name:<36}{journey['steps']:>10}{journey['runs']:>10}"
+                     f"{journey['p50_ms']:>10.1f}{journey['peak_kib']:>10.0f}")
+    throughput, emails = results['throughput'], results['emails']
+    lines += [
+        "",
+        f"{results['sessions']} sessions: {throughput['sessions_per_s']:.2f} sessions/s, "
+        f"{throughput['runs_per_s']:.1f} script runs/s",
+        f"{emails['mode']} notifications: {emails['notified']}/{emails['enquiries']} enquiries "
+        f"notified in {emails['sent']} emails",
+    ]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=5, help="simulated visitors per journey")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if the results regress past the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown/growth before a number counts as a regression")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    parser.add_argument("--notify-mode", choices=("immediate", "digest"), default="immediate",
+                        help="NOTIFY_MODE for the contact journeys")
+    parser.add_argument("--startup", action="store_true", help="measure cold start instead of the journeys")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh processes for --startup")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir, FakeSMTPServer() as smtp:
+        configure(Path(workdir), smtp.port, args.notify_mode)
+        sys.path.insert(0, str(ROOT))
+        seed_images()
+        if args.startup:
+            results = {'startup': startup(args.repeats)}
+            print(startup_report(results['startup']))
+        else:
+            results = benchmark(args.sessions, smtp)
+            print(report(results))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        # Journey and startup numbers share the file; keep whichever wasn't rerun
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.check:
+        if not args.baseline.exists():
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        problems = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if problems:
+            print("\nRegressions:\n  " + "\n  ".join(problems))
+            return 1
+        print("\nNo regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
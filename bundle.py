@@ -0,0 +1,87 @@
+"""One minified, content-hashed stylesheet: the site CSS with its icons inlined.
+
+python bundle.py [--out static/]  -- write the bundle file for a static server or CDN
+
+The app inlines the same bundle as a single <style> element. It is a few KB,
+and with global.minCachedMessageSize below that size Streamlit sends its
+bytes once per session; later reruns carry only a reference to the cached
+message.
+"""
+import argparse
+import base64
+import functools
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote
+
+from markup import CSS
+
+ICON_DIR = Path(__file__).parent / "icons"
+DEFAULT_OUT = Path(__file__).parent / "static"
+
+
+def minify_css(css):
+    """Drop comments and insignificant whitespace"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def data_uri(path):
+    """Inline form of an icon: URL-encoded SVG (smaller than base64), base64 otherwise"""
+    path = Path(path)
+    if path.suffix == ".svg":
+        svg = re.sub(r">\s+<", "><", path.read_text(encoding="utf-8").strip())
+        return "data:image/svg+xml," + quote(svg.replace('"', "'"), safe=" ':/=,.-()")
+    mime = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return f"data:{mime};base64,{base64.b64encode(path.read_bytes()).decode('ascii')}"
+
+
+def icon_rules(directory=ICON_DIR):
+    """.icon-<name> background rules for every icon in the directory"""
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix in (".svg", ".png", ".webp"))
+    return "".join(f'.icon-{path.stem}{{background-image:url("{data_uri(path)}")}}' for path in paths)
+
+
+@dataclass(frozen=True)
+class Bundle:
+    css: str
+
+    @property
+    def digest(self):
+        return hashlib.sha256(self.css.encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def name(self):
+        return f"bundle.{self.digest}.css"
+
+    @property
+    def style_tag(self):
+        return f"<style>{self.css}</style>"
+
+
+@functools.lru_cache(maxsize=1)
+def get_bundle() -> Bundle:
+    """The bundle, built once per process"""
+    return Bundle(minify_css(CSS) + icon_rules())
+
+
+def write_bundle(directory=DEFAULT_OUT, bundle=None):
+    """Write the bundle under its hashed name (safe to cache forever); returns the path"""
+    bundle = bundle or get_bundle()
+    path = Path(directory) / bundle.name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(bundle.css, encoding="utf-8")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the CSS bundle")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="output directory (default static/)")
+    args = parser.parse_args()
+    print(write_bundle(args.out))
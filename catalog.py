@@ -0,0 +1,445 @@
+"""Property catalog backed by a local SQLite store"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+import streamlit as st
+
+from config import get_snapshot
+from geo import locate
+from parsing import PARSER_VERSION, normalize_listing
+
+DEFAULT_DB_PATH = Path(__file__).parent / "data" / "catalog.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    slug TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    location TEXT NOT NULL,
+    district TEXT NOT NULL,
+    icon TEXT NOT NULL DEFAULT '🏞️',
+    summary TEXT NOT NULL DEFAULT '',
+    price_text TEXT NOT NULL DEFAULT '',
+    area_text TEXT NOT NULL DEFAULT '',
+    price_min REAL,
+    price_max REAL,
+    rate_min REAL,
+    rate_max REAL,
+    area_min REAL,
+    area_max REAL,
+    latitude REAL,
+    longitude REAL,
+    features TEXT NOT NULL DEFAULT '[]',
+    image_url TEXT NOT NULL DEFAULT '',
+    featured INTEGER NOT NULL DEFAULT 0,
+    sort_order INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'active',
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_listings_district ON listings(district);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings(price_min, price_max);
+CREATE INDEX IF NOT EXISTS idx_listings_area ON listings(area_min, area_max);
+CREATE INDEX IF NOT EXISTS idx_listings_featured ON listings(featured, sort_order);
+
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('version', 0);
+
+CREATE TRIGGER IF NOT EXISTS listings_version_insert AFTER INSERT ON listings
+BEGIN UPDATE catalog_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER IF NOT EXISTS listings_version_update AFTER UPDATE ON listings
+BEGIN UPDATE catalog_meta SET value = value + 1 WHERE key = 'version'; END;
+CREATE TRIGGER IF NOT EXISTS listings_version_delete AFTER DELETE ON listings
+BEGIN UPDATE catalog_meta SET value = value + 1 WHERE key = 'version'; END;
+"""
+
+
+def _midpoint_sql(low, high):
+    # Midpoint of a parsed range; open-ended ones ("from ₹25 Lakhs") use the lower bound
+    return f"(CASE WHEN {high} IS NULL OR {high} > 1e300 THEN {low} ELSE ({low} + {high}) / 2 END)"
+
+
+def _values_sql(row):
+    """SQL for a listing row's (district, price per sq.ft., asking price)"""
+    price = _midpoint_sql(f"{row}.price_min", f"{row}.price_max")
+    area = _midpoint_sql(f"{row}.area_min", f"{row}.area_max")
+    rate = (f"COALESCE({_midpoint_sql(f'{row}.rate_min', f'{row}.rate_max')}, "
+            f"CASE WHEN {row}.area_min > 0 THEN {price} / {area} END)")
+    return f"{row}.district", rate, price
+
+
+_NEW, _OLD = _values_sql("NEW"), _values_sql("OLD")
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+# Append-only log of listings being added, repriced (or moved), sold and
+# removed, written by triggers so every path into the store is covered.
+# market.py folds it into rollups.
+EVENTS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS listing_events (
+    id INTEGER PRIMARY KEY,
+    listing_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    district TEXT NOT NULL,
+    rate REAL,
+    price REAL,
+    old_district TEXT,
+    old_rate REAL,
+    old_price REAL,
+    at REAL NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS listings_event_add AFTER INSERT ON listings WHEN NEW.status = 'active'
+BEGIN INSERT INTO listing_events (listing_id, event, district, rate, price, at)
+VALUES (NEW.id, 'add', {', '.join(_NEW)}, NEW.updated_at); END;
+
+CREATE TRIGGER IF NOT EXISTS listings_event_reprice AFTER UPDATE ON listings
+WHEN OLD.status = 'active' AND NEW.status = 'active'
+ AND ({_NEW[0]} IS NOT {_OLD[0]} OR {_NEW[1]} IS NOT {_OLD[1]} OR {_NEW[2]} IS NOT {_OLD[2]})
+BEGIN INSERT INTO listing_events (listing_id, event, district, rate, price, old_district, old_rate, old_price, at)
+VALUES (NEW.id, 'reprice', {', '.join(_NEW)}, {', '.join(_OLD)}, NEW.updated_at); END;
+
+CREATE TRIGGER IF NOT EXISTS listings_event_sold AFTER UPDATE ON listings
+WHEN OLD.status = 'active' AND NEW.status = 'sold'
+BEGIN INSERT INTO listing_events (listing_id, event, district, rate, price, at)
+VALUES (OLD.id, 'sold', {', '.join(_OLD)}, NEW.updated_at); END;
+
+CREATE TRIGGER IF NOT EXISTS listings_event_relist AFTER UPDATE ON listings
+WHEN OLD.status <> 'active' AND NEW.status = 'active'
+BEGIN INSERT INTO listing_events (listing_id, event, district, rate, price, at)
+VALUES (NEW.id, 'add', {', '.join(_NEW)}, NEW.updated_at); END;
+
+CREATE TRIGGER IF NOT EXISTS listings_event_remove AFTER DELETE ON listings WHEN OLD.status = 'active'
+BEGIN INSERT INTO listing_events (listing_id, event, district, rate, price, at)
+VALUES (OLD.id, 'remove', {', '.join(_OLD)}, {_NOW}); END;
+"""
+
+_UNSPLASH = "https://images.unsplash.com/photo-{}?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80"
+
+# Listings the store is seeded with the first time it is created
+SEED_LISTINGS = [
+    {
+        "slug": "mountain-view-plots-shimla",
+        "title": "Mountain View Plots",
+        "location": "Shimla",
+        "district": "Shimla",
+        "icon": "🏔️",
+        "summary": "Panoramic mountain views, gated community, 24/7 security",
+        "price_text": "Starting from ₹25 Lakhs",
+        "features": ["Panoramic mountain views", "Gated community", "24/7 security"],
+        "image_url": _UNSPLASH.format("1600585154340-be6161a56a0c"),
+        "featured": True,
+        "sort_order": 1,
+    },
+    {
+        "slug": "riverside-land-parcels-kullu",
+        "title": "Riverside Land Parcels",
+        "location": "Kullu",
+        "district": "Kullu",
+        "icon": "🏞️",
+        "summary": "Adjacent to river, lush green surroundings, peaceful environment",
+        "price_text": "Starting from ₹35 Lakhs",
+        "features": ["Adjacent to river", "Lush green surroundings", "Peaceful environment"],
+        "image_url": _UNSPLASH.format("1600607687939-ce8a6c25118c"),
+        "featured": True,
+        "sort_order": 2,
+    },
+    {
+        "slug": "premium-hilltop-land-shimla",
+        "title": "Premium Hilltop Land",
+        "location": "Shimla",
+        "district": "Shimla",
+        "icon": "🌄",
+        "summary": "Breathtaking valley views, all-weather road connectivity",
+        "price_text": "₹30 Lakhs - ₹50 Lakhs per acre",
+        "area_text": "5-10 Acres available",
+        "features": ["Breathtaking valley views", "All-weather road connectivity",
+                     "Clear titles with proper documentation", "Ideal for resort or farmhouse"],
+        "image_url": _UNSPLASH.format("1580587771525-78b9dba3b914"),
+        "sort_order": 3,
+    },
+    {
+        "slug": "forest-facing-plots-manali",
+        "title": "Forest Facing Plots",
+        "location": "Manali",
+        "district": "Kullu",
+        "icon": "🌲",
+        "summary": "Dense deodar forest view, gated community",
+        "price_text": "₹2000-₹2500 per sq.ft.",
+        "area_text": "2400-5000 sq.ft. plots",
+        "features": ["Dense deodar forest view", "Gated community",
+                     "Water and electricity connections", "10 minutes from Manali Mall Road"],
+        "image_url": _UNSPLASH.format("1600566752225-7a0c8b5c1b5f"),
+        "sort_order": 4,
+    },
+]
+
+_COLUMNS = ("slug", "title", "location", "district", "icon", "summary", "price_text",
+            "area_text", "price_min", "price_max", "rate_min", "rate_max", "area_min",
+            "area_max", "latitude", "longitude", "features", "image_url", "featured", "sort_order",
+            "status", "updated_at")
+
+# Columns added after the first release, with their SQL type
+_MIGRATIONS = (("rate_min", "REAL"), ("rate_max", "REAL"), ("latitude", "REAL"), ("longitude", "REAL"),
+               ("status", "TEXT NOT NULL DEFAULT 'active'"))
+
+
+@dataclass(frozen=True)
+class Listing:
+    id: int
+    slug: str
+    title: str
+    location: str
+    district: str
+    icon: str = "🏞️"
+    summary: str = ""
+    price_text: str = ""
+    area_text: str = ""
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    rate_min: Optional[float] = None
+    rate_max: Optional[float] = None
+    area_min: Optional[float] = None
+    area_max: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    features: Tuple[str, ...] = ()
+    image_url: str = ""
+    featured: bool = False
+    sort_order: int = 0
+
+    @property
+    def display_name(self):
+        """Name used in enquiries, e.g. "Premium Hilltop Land - Shimla\""""
+        return f"{self.title} - {self.location}"
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            id=row["id"], slug=row["slug"], title=row["title"], location=row["location"],
+            district=row["district"], icon=row["icon"], summary=row["summary"],
+            price_text=row["price_text"], area_text=row["area_text"],
+            price_min=row["price_min"], price_max=row["price_max"],
+            rate_min=row["rate_min"], rate_max=row["rate_max"],
+            area_min=row["area_min"], area_max=row["area_max"],
+            latitude=row["latitude"], longitude=row["longitude"],
+            features=tuple(json.loads(row["features"])), image_url=row["image_url"],
+            featured=bool(row["featured"]), sort_order=row["sort_order"],
+        )
+
+
+@dataclass(frozen=True)
+class Catalog:
+    """Immutable, pre-indexed view of every listing at one catalog version"""
+    version: int
+    listings: Tuple[Listing, ...] = ()
+    by_slug: Mapping[str, Listing] = field(default_factory=lambda: MappingProxyType({}))
+    featured: Tuple[Listing, ...] = ()
+    positions: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+
+# One connection per store, shared by every thread (each Streamlit rerun runs
+# on a new one) and serialized by its lock
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_db_path():
+    """Location of the catalog store (CATALOG_DB, default data/catalog.db)"""
+    return Path(get_snapshot().get_str('CATALOG_DB') or DEFAULT_DB_PATH)
+
+
+@contextmanager
+def _connect(path):
+    """The store's shared connection, held exclusively for the with block"""
+    path = Path(path)
+    with _connections_lock:
+        entry = _connections.get(path)
+        if entry is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            _init_store(conn)
+            entry = _connections[path] = (conn, threading.Lock())
+    conn, lock = entry
+    with lock:
+        yield conn
+
+
+def _init_store(conn):
+    with conn:
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(listings)")}
+        tables = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if existing:
+            for column, sql_type in _MIGRATIONS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE listings ADD COLUMN {column} {sql_type}")
+        conn.executescript(SCHEMA + EVENTS_SCHEMA)
+        parser = conn.execute("SELECT value FROM catalog_meta WHERE key = 'parser'").fetchone()
+        if existing and (not existing.issuperset(c for c, _ in _MIGRATIONS)
+                         or parser is None or parser[0] != PARSER_VERSION):
+            _renormalize(conn)
+        conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('parser', ?)", (PARSER_VERSION,))
+        if existing and "listing_events" not in tables:
+            # Stores from before the event log start it with the current listings
+            conn.execute(f"INSERT INTO listing_events (listing_id, event, district, rate, price, at) "
+                         f"SELECT id, 'add', {', '.join(_values_sql('listings'))}, "
+                         f"CASE WHEN updated_at > 0 THEN updated_at ELSE {_NOW} END "
+                         f"FROM listings WHERE status = 'active' ORDER BY id")
+        if conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0] == 0:
+            for listing in SEED_LISTINGS:
+                _upsert(conn, listing)
+
+
+def _coordinates(location):
+    """Latitude/longitude columns from the gazetteer town in a location, if any"""
+    point = locate(location)
+    return {"latitude": point[0], "longitude": point[1]} if point else {}
+
+
+def _renormalize(conn):
+    rows = conn.execute("SELECT id, location, price_text, area_text FROM listings").fetchall()
+    for row in rows:
+        numbers = normalize_listing(row["price_text"], row["area_text"])
+        assignments = [f"{c} = ?" for c in numbers]
+        coordinates = _coordinates(row["location"])
+        # Keep coordinates that were set explicitly
+        assignments += [f"{c} = COALESCE({c}, ?)" for c in coordinates]
+        conn.execute(
+            f"UPDATE listings SET {', '.join(assignments)} WHERE id = ?",
+            [*numbers.values(), *coordinates.values(), row["id"]],
+        )
+
+
+def _upsert(conn, listing):
+    # Numeric columns are derived from the price/area text and coordinates
+    # from the location's town, unless given explicitly
+    listing = {k: v for k, v in listing.items() if v is not None}
+    row = conn.execute("SELECT price_text, area_text FROM listings WHERE slug = ?", (listing["slug"],)).fetchone()
+    if row is not None:
+        _update(conn, row, listing)
+        return
+    listing = {**normalize_listing(listing.get("price_text"), listing.get("area_text")),
+               **_coordinates(listing.get("location")), **listing}
+    values = {column: listing.get(column) for column in _COLUMNS}
+    values["features"] = json.dumps(list(listing.get("features", ())), ensure_ascii=False)
+    values["featured"] = int(bool(listing.get("featured", False)))
+    values["sort_order"] = listing.get("sort_order", 0)
+    values["updated_at"] = time.time()
+    for column in ("icon", "summary", "price_text", "area_text", "image_url", "status"):
+        if values[column] is None:
+            values.pop(column)
+    columns = list(values)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "slug")
+    conn.execute(
+        f"INSERT INTO listings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT(slug) DO UPDATE SET {updates}",
+        [values[c] for c in columns],
+    )
+
+
+def _update(conn, row, listing):
+    # Only the given columns change; a new price or area text is normalized
+    # against the stored other half, and a new location moves the coordinates
+    derived = {}
+    if "price_text" in listing or "area_text" in listing:
+        derived.update(normalize_listing(listing.get("price_text", row["price_text"]),
+                                         listing.get("area_text", row["area_text"])))
+    if "location" in listing:
+        derived.update(_coordinates(listing["location"]) or {"latitude": None, "longitude": None})
+    listing = {**derived, **listing}
+    values = {column: listing[column] for column in _COLUMNS if column in listing and column != "slug"}
+    if "features" in values:
+        values["features"] = json.dumps(list(values["features"]), ensure_ascii=False)
+    if "featured" in values:
+        values["featured"] = int(bool(values["featured"]))
+    values["updated_at"] = time.time()
+    conn.execute(
+        f"UPDATE listings SET {', '.join(f'{c} = ?' for c in values)} WHERE slug = ?",
+        [*values.values(), listing["slug"]],
+    )
+
+
+def upsert_listing(listing, path=None):
+    """Insert or update a listing (a dict keyed by column name, matched on slug).
+
+    For a listing already in the store only the given columns change, so
+    {"slug": ..., "price_text": ...} is enough to reprice it.
+    """
+    with _connect(path or get_db_path()) as conn, conn:
+        _upsert(conn, listing)
+
+
+def mark_sold(slug, path=None):
+    """Take a listing off the market; it stays in the store and the market rollups"""
+    with _connect(path or get_db_path()) as conn, conn:
+        conn.execute("UPDATE listings SET status = 'sold', updated_at = ? WHERE slug = ? AND status = 'active'",
+                     (time.time(), slug))
+
+
+def delete_listing(slug, path=None):
+    """Remove a listing from the store"""
+    with _connect(path or get_db_path()) as conn, conn:
+        conn.execute("DELETE FROM listings WHERE slug = ?", (slug,))
+
+
+def catalog_version(path=None) -> int:
+    """Current catalog version, bumped by triggers on every change to the store"""
+    with _connect(path or get_db_path()) as conn:
+        return conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()[0]
+
+
+def listing_events(after=0, path=None):
+    """Rows of the listing event log with id > after, oldest first"""
+    with _connect(path or get_db_path()) as conn:
+        return conn.execute("SELECT * FROM listing_events WHERE id > ? ORDER BY id", (after,)).fetchall()
+
+
+def last_event_id(path=None) -> int:
+    with _connect(path or get_db_path()) as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM listing_events").fetchone()[0]
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_catalog(path, version):
+    with _connect(path) as conn:
+        rows = conn.execute("SELECT * FROM listings WHERE status = 'active' ORDER BY sort_order, id").fetchall()
+    listings = tuple(Listing.from_row(row) for row in rows)
+    return Catalog(
+        version=version,
+        listings=listings,
+        by_slug=MappingProxyType({listing.slug: listing for listing in listings}),
+        featured=tuple(listing for listing in listings if listing.featured),
+        positions=MappingProxyType({listing.slug: i for i, listing in enumerate(listings)}),
+    )
+
+
+def get_catalog(path=None) -> Catalog:
+    """Cached catalog for the current store version; re-read only after a change"""
+    path = str(path or get_db_path())
+    return _load_catalog(path, catalog_version(path))
+
+
+if __name__ == "__main__":
+    # python catalog.py import listings.json  -- upsert listings from a JSON array
+    # python catalog.py sold <slug>            -- mark a listing as sold
+    if len(sys.argv) == 3 and sys.argv[1] == "import":
+        with open(sys.argv[2], encoding="utf-8") as f:
+            for item in json.load(f):
+                upsert_listing(item)
+        print(f"Catalog version {catalog_version()}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "sold":
+        mark_sold(sys.argv[2])
+        print(f"Catalog version {catalog_version()}")
+    else:
+        print("usage: python catalog.py import <listings.json> | sold <slug>")
@@ -0,0 +1,176 @@
+"""Configuration snapshot built from Streamlit secrets, the environment and .env"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) the source files are stat()ed to detect changes
+CHECK_INTERVAL = 2.0
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
+
+_lock = threading.Lock()
+_snapshot = None
+_fingerprint = None
+_checked_at = 0.0
+_dotenv_path = None
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable view of every configuration value at one point in time"""
+    values: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    version: int = 0
+
+    def get(self, key, default=None):
+        """Get a raw value, secrets first, then environment, then .env"""
+        return self.values.get(key, default)
+
+    def get_str(self, key, default=""):
+        """Get a value as a string with surrounding quotes stripped"""
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return str(value).strip().strip('"\'')
+
+    def get_int(self, key, default=0):
+        """Get a value as an int, falling back to the default if it doesn't parse"""
+        try:
+            return int(self.get_str(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        """Get a value as a float, falling back to the default if it doesn't parse"""
+        try:
+            return float(self.get_str(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        """Get a value as a bool ("1", "true", "yes" and "on" are true)"""
+        value = self.values.get(key)
+        if value is None:
+            return default
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().strip('"\'').lower() in _TRUE_VALUES
+
+
+def _secrets_paths():
+    """Locations Streamlit reads secrets.toml from"""
+    paths = getattr(st.secrets, "_file_paths", None)
+    if paths:
+        return [Path(p) for p in paths]
+    return [Path.home() / ".streamlit" / "secrets.toml",
+            Path.cwd() / ".streamlit" / "secrets.toml"]
+
+
+def _get_dotenv_path():
+    global _dotenv_path
+    if _dotenv_path is None:
+        from dotenv import find_dotenv
+        _dotenv_path = Path(find_dotenv(usecwd=True) or Path.cwd() / ".env")
+    return _dotenv_path
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _current_fingerprint():
+    paths = [_get_dotenv_path(), *_secrets_paths()]
+    return tuple((str(p), _mtime(p)) for p in paths)
+
+
+def _read_secrets():
+    """Top-level secrets, parsed straight from the secrets.toml files.
+
+    st.secrets keeps its first parse, so it would miss the edits the
+    fingerprint detects. Later files win, as in Streamlit. Raises ValueError
+    if a file doesn't parse.
+    """
+    import toml  # Streamlit's own secrets parser
+    values = {}
+    for path in _secrets_paths():
+        try:
+            text = path.read_text(encoding="utf-8")
+        except OSError:
+            continue
+        try:
+            values.update(toml.loads(text))
+        except toml.TomlDecodeError as e:
+            raise ValueError(f"{path}: {e}") from e
+    return values
+
+
+def _load_values(secrets=True):
+    # Same precedence as before: secrets override the environment, and the
+    # environment overrides .env (load_dotenv never overrode existing vars)
+    from dotenv import dotenv_values
+    path = _get_dotenv_path()
+    values = {k: v for k, v in dotenv_values(path).items() if v is not None} if path.exists() else {}
+    values.update(os.environ)
+    if secrets:
+        values.update(_read_secrets())
+    return values
+
+
+def get_snapshot(force=False) -> ConfigSnapshot:
+    """Get the current configuration snapshot, reloading it only if a source changed"""
+    global _snapshot, _fingerprint, _checked_at
+    now = time.monotonic()
+    if not force and _snapshot is not None and now - _checked_at < CHECK_INTERVAL:
+        return _snapshot
+
+    with _lock:
+        if not force and _snapshot is not None and now - _checked_at < CHECK_INTERVAL:
+            return _snapshot
+        fingerprint = _current_fingerprint()
+        if force or _snapshot is None or fingerprint != _fingerprint:
+            try:
+                values = _load_values()
+            except ValueError as e:
+                if _snapshot is not None:
+                    # Probably caught mid-save; keep the old values and look
+                    # again at the next check
+                    logger.warning("Keeping the previous configuration: %s", e)
+                    _checked_at = time.monotonic()
+                    return _snapshot
+                logger.error("Ignoring secrets that don't parse: %s", e)
+                values = _load_values(secrets=False)
+            previous = _snapshot
+            if previous is not None and dict(previous.values) == values:
+                version = previous.version
+            else:
+                version = (previous.version if previous else 0) + 1
+            _snapshot = ConfigSnapshot(MappingProxyType(values), version)
+            _fingerprint = fingerprint
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def get_config(key, default=None):
+    """Get a single configuration value from the current snapshot"""
+    return get_snapshot().get(key, default)
+
+
+def config_version() -> int:
+    """Version number of the configuration, bumped whenever a value changes"""
+    return get_snapshot().version
+
+
+def reload_config() -> Optional[ConfigSnapshot]:
+    """Force a reload of secrets and .env regardless of file timestamps"""
+    return get_snapshot(force=True)
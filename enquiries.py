@@ -0,0 +1,248 @@
+"""Durable enquiry log with idempotent submission and per-visitor rate limiting"""
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent / "data" / "enquiries.db"
+
+# Group commit: the writer waits this long for more records before committing
+BATCH_WINDOW = 0.005
+BATCH_SIZE = 200
+# Longest wait for the writer thread to open the database
+OPEN_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS enquiries (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    subject TEXT NOT NULL DEFAULT '',
+    property TEXT NOT NULL DEFAULT '',
+    message TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_enquiries_created ON enquiries(created_at);
+
+CREATE TABLE IF NOT EXISTS enquiry_events (
+    id INTEGER PRIMARY KEY,
+    enquiry_id INTEGER NOT NULL REFERENCES enquiries(id),
+    event TEXT NOT NULL,
+    detail TEXT NOT NULL DEFAULT '',
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_enquiry_events_enquiry ON enquiry_events(enquiry_id);
+"""
+
+
+@dataclass
+class Enquiry:
+    session_id: str
+    name: str
+    email: str
+    phone: str
+    message: str
+    subject: str = ""
+    property_name: str = ""
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def idempotency_key(self):
+        """Hash of the session and normalized form fields; resubmits share it"""
+        parts = (self.session_id, self.name.strip().lower(), self.email.strip().lower(),
+                 self.phone.strip(), self.subject, self.property_name, " ".join(self.message.split()))
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class _Pending:
+    __slots__ = ("enquiry", "done", "result")
+
+    def __init__(self, enquiry):
+        self.enquiry = enquiry
+        self.done = threading.Event()
+        self.result = None
+
+
+class EnquiryLog:
+    """Append-only SQLite (WAL) log of enquiries.
+
+    Records are written by a single writer thread that commits whatever has
+    queued up in one transaction (group commit), so a burst of submissions
+    costs one fsync instead of one each. append() blocks until its record is
+    durable, which happens before any notification is attempted.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._open_error = None
+        self._writer = threading.Thread(target=self._run, name="enquiry-log", daemon=True)
+        self._writer.start()
+        if not self._ready.wait(OPEN_TIMEOUT):
+            raise TimeoutError(f"Timed out opening the enquiry log {self.path}")
+        if self._open_error is not None:
+            raise self._open_error
+
+    def _open(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL: in WAL mode NORMAL skips the fsync on commit, and the record must
+        # be on disk before append() returns. Group commit pays it once per batch.
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._open()
+        except Exception as e:
+            # Raised from __init__; this writer stops and the next get_enquiry_log() retries
+            self._open_error = e
+            return
+        finally:
+            self._ready.set()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+            except Exception as e:
+                # Fail every waiter in the batch and keep the writer running for the next one
+                logger.error("Could not write %d enquiry records: %s", len(batch), e)
+                for item in batch:
+                    if isinstance(item, _Pending):
+                        item.result = e
+                        item.done.set()
+
+    def _write(self, conn, batch):
+        with conn:
+            for item in batch:
+                if isinstance(item, _Pending):
+                    e = item.enquiry
+                    key = e.idempotency_key
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO enquiries (idempotency_key, created_at, session_id, "
+                        "name, email, phone, subject, property, message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, e.created_at, e.session_id, e.name, e.email, e.phone,
+                         e.subject, e.property_name, e.message),
+                    )
+                    if cursor.rowcount:
+                        item.result = (cursor.lastrowid, False)
+                    else:
+                        row = conn.execute("SELECT id FROM enquiries WHERE idempotency_key = ?", (key,)).fetchone()
+                        item.result = (row[0], True)
+                else:
+                    conn.execute("INSERT INTO enquiry_events (enquiry_id, event, detail, at) VALUES (?, ?, ?, ?)", item)
+        for item in batch:
+            if isinstance(item, _Pending):
+                item.done.set()
+
+    def append(self, enquiry, timeout=10.0):
+        """Durably record an enquiry; returns (enquiry_id, duplicate)"""
+        pending = _Pending(enquiry)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out writing the enquiry log")
+        if isinstance(pending.result, Exception):
+            raise pending.result
+        return pending.result
+
+    def record_event(self, enquiry_id, event, detail=""):
+        """Append a status event (e.g. "notified") without waiting for the commit"""
+        self._queue.put((enquiry_id, event, detail, time.time()))
+
+    def unnotified(self, since=0.0, until=None):
+        """(id, Enquiry) for enquiries created in [since, until] that were
+        neither notified nor held back, oldest first"""
+        until = time.time() if until is None else until
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT id, session_id, name, email, phone, message, subject, property, created_at "
+                "FROM enquiries WHERE created_at BETWEEN ? AND ? AND id NOT IN "
+                "(SELECT enquiry_id FROM enquiry_events WHERE event IN ('notified', 'held')) ORDER BY id",
+                (since, until),
+            ).fetchall()
+        return [(row[0], Enquiry(*row[1:])) for row in rows]
+
+
+class RateLimiter:
+    """Token buckets keyed by session, phone and email.
+
+    Each key gets `burst` tokens refilled at `rate` tokens per second; a
+    submission must take a token from every one of its keys.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def allow(self, *keys):
+        now = time.monotonic()
+        keys = [key for key in keys if key]
+        with self._lock:
+            levels = []
+            for key in keys:
+                tokens, updated = self._buckets.get(key, (self.burst, now))
+                levels.append(min(self.burst, tokens + (now - updated) * self.rate))
+            if any(level < 1 for level in levels):
+                return False
+            for key, level in zip(keys, levels):
+                self._buckets[key] = (level - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return True
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no information
+        full_after = self.burst / self.rate if self.rate else float("inf")
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+
+
+_log = None
+_limiter = None
+_lock = threading.Lock()
+
+
+def get_enquiry_log():
+    """Process-wide enquiry log (ENQUIRY_DB, default data/enquiries.db)"""
+    global _log
+    if _log is None:
+        with _lock:
+            if _log is None:
+                _log = EnquiryLog(get_snapshot().get_str('ENQUIRY_DB') or DEFAULT_DB_PATH)
+    return _log
+
+
+def get_rate_limiter():
+    """Process-wide limiter: ENQUIRY_BURST submissions, refilled at ENQUIRY_RATE_PER_HOUR"""
+    global _limiter
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                config = get_snapshot()
+                _limiter = RateLimiter(rate=config.get_float('ENQUIRY_RATE_PER_HOUR', 10.0) / 3600,
+                                       burst=config.get_int('ENQUIRY_BURST', 3))
+    return _limiter
@@ -0,0 +1,186 @@
+"""Column-wise listing data and vectorized filtering for the Properties tab"""
+import re
+from dataclasses import dataclass, field
+from typing import FrozenSet, Mapping, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+# Feature flags: label shown in the UI and the pattern matched against the
+# listing's features and summary. Each flag is one bit of a uint64 bitset.
+FEATURE_FLAGS = {
+    "gated": ("Gated community", re.compile(r"\bgated\b", re.IGNORECASE)),
+    "road": ("Road connectivity", re.compile(r"\broad\b", re.IGNORECASE)),
+    "views": ("Mountain / valley views", re.compile(r"\b(?:view|views|panoramic)\b", re.IGNORECASE)),
+    "river": ("Riverside", re.compile(r"\briver", re.IGNORECASE)),
+    "forest": ("Forest facing", re.compile(r"\b(?:forest|deodar|pine)\b", re.IGNORECASE)),
+    "utilities": ("Water & electricity", re.compile(r"\b(?:water|electricity)\b", re.IGNORECASE)),
+    "clear_title": ("Clear titles", re.compile(r"\bclear\s+titles?\b", re.IGNORECASE)),
+    "security": ("24/7 security", re.compile(r"\bsecurity\b", re.IGNORECASE)),
+}
+FEATURE_BITS = {name: np.uint64(1 << i) for i, name in enumerate(FEATURE_FLAGS)}
+
+# Sort keys for the listing; "recommended" is catalog order (featured first),
+# "distance" is nearest first when a "near" point is set and "relevance" is
+# best match first when there is a search
+SORT_KEYS = ("recommended", "price_asc", "price_desc", "area_asc", "area_desc", "distance", "relevance")
+
+
+@dataclass(frozen=True)
+class ListingQuery:
+    """Filter criteria; None or empty means "don't filter on this\""""
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    area_min: Optional[float] = None
+    area_max: Optional[float] = None
+    districts: FrozenSet[str] = frozenset()
+    features: FrozenSet[str] = frozenset()
+    # Applied through the spatial index (geo.py) and search index (search.py), not mask()
+    near: Optional[Tuple[float, float]] = None
+    radius_km: float = 30.0
+    text: str = ""
+
+
+def feature_bits(texts) -> int:
+    """Bitset of the FEATURE_FLAGS matched by any of the given strings"""
+    text = " ".join(texts)
+    bits = 0
+    for i, (_, pattern) in enumerate(FEATURE_FLAGS.values()):
+        if pattern.search(text):
+            bits |= 1 << i
+    return bits
+
+
+def _column(values, missing):
+    return np.array([missing if v is None else v for v in values], dtype=np.float64)
+
+
+@dataclass(frozen=True, eq=False)
+class ListingColumns:
+    """Numeric columns for every listing, in catalog order.
+
+    Unknown lower bounds are stored as -inf and unknown upper bounds as +inf
+    so range overlap checks need no special cases; has_price/has_area record
+    which listings have a parsed value at all.
+    """
+    version: int
+    price_min: np.ndarray
+    price_max: np.ndarray
+    area_min: np.ndarray
+    area_max: np.ndarray
+    has_price: np.ndarray
+    has_area: np.ndarray
+    district_codes: np.ndarray
+    features: np.ndarray
+    districts: Tuple[str, ...] = field(default=())
+    sort_orders: Mapping[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, catalog):
+        listings = catalog.listings
+        districts = tuple(sorted({listing.district for listing in listings}))
+        codes = {name: i for i, name in enumerate(districts)}
+        price_min = _column((item.price_min for item in listings), -np.inf)
+        area_min = _column((item.area_min for item in listings), -np.inf)
+        return cls(
+            version=catalog.version,
+            price_min=price_min,
+            price_max=_column((item.price_max for item in listings), np.inf),
+            area_min=area_min,
+            area_max=_column((item.area_max for item in listings), np.inf),
+            has_price=np.array([item.price_min is not None for item in listings], dtype=bool),
+            has_area=np.array([item.area_min is not None for item in listings], dtype=bool),
+            district_codes=np.array([codes[item.district] for item in listings], dtype=np.int32),
+            features=np.array([feature_bits((item.summary, *item.features)) for item in listings], dtype=np.uint64),
+            districts=districts,
+            sort_orders=_sort_orders(price_min, area_min),
+        )
+
+    def __len__(self):
+        return len(self.district_codes)
+
+    def price_bounds(self):
+        """Smallest and largest finite price across the catalog"""
+        values = np.concatenate([self.price_min, self.price_max])
+        values = values[np.isfinite(values)]
+        return (float(values.min()), float(values.max())) if len(values) else (0.0, 0.0)
+
+    def area_bounds(self):
+        """Smallest and largest finite area across the catalog"""
+        values = np.concatenate([self.area_min, self.area_max])
+        values = values[np.isfinite(values)]
+        return (float(values.min()), float(values.max())) if len(values) else (0.0, 0.0)
+
+    def mask(self, query) -> np.ndarray:
+        """Boolean mask of listings matching every criterion of the query"""
+        mask = np.ones(len(self), dtype=bool)
+        if query.price_min is not None or query.price_max is not None:
+            low = -np.inf if query.price_min is None else query.price_min
+            high = np.inf if query.price_max is None else query.price_max
+            mask &= self.has_price & (self.price_min <= high) & (self.price_max >= low)
+        if query.area_min is not None or query.area_max is not None:
+            low = -np.inf if query.area_min is None else query.area_min
+            high = np.inf if query.area_max is None else query.area_max
+            mask &= self.has_area & (self.area_min <= high) & (self.area_max >= low)
+        if query.districts:
+            wanted = [i for i, name in enumerate(self.districts) if name in query.districts]
+            mask &= np.isin(self.district_codes, wanted)
+        if query.features:
+            required = np.uint64(0)
+            for name in query.features:
+                required |= FEATURE_BITS[name]
+            mask &= (self.features & required) == required
+        return mask
+
+    def select(self, query, sort="recommended", within=(), rankings=None) -> np.ndarray:
+        """Catalog indices of matching listings in the given sort order.
+
+        Uses the permutation precomputed for the sort key, so this is a single
+        O(n) gather rather than a sort on every rerun. within holds index
+        arrays from spatial or text queries that a match must also be in;
+        rankings maps extra sort keys ("distance", "relevance") to the
+        ordered indices those queries returned.
+        """
+        mask = self.mask(query)
+        for indices in within:
+            allowed = np.zeros(len(self), dtype=bool)
+            allowed[indices] = True
+            mask &= allowed
+        order = (rankings or {}).get(sort)
+        if order is None:
+            order = self.sort_orders.get(sort)
+        if order is None:
+            return np.flatnonzero(mask)
+        return order[mask[order]]
+
+
+def _ascending(values):
+    # Listings without a value go last in both directions
+    return np.argsort(np.where(np.isfinite(values), values, np.inf), kind="stable")
+
+
+def _descending(values):
+    return np.argsort(np.where(np.isfinite(values), -values, np.inf), kind="stable")
+
+
+def _sort_orders(price_min, area_min):
+    orders = {
+        "recommended": np.arange(len(price_min)),
+        "price_asc": _ascending(price_min),
+        "price_desc": _descending(price_min),
+        "area_asc": _ascending(area_min),
+        "area_desc": _descending(area_min),
+    }
+    for order in orders.values():
+        order.setflags(write=False)
+    return orders
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_columns(version, _catalog):
+    return ListingColumns.build(_catalog)
+
+
+def get_columns(catalog) -> ListingColumns:
+    """Columns for a catalog, built once per catalog version"""
+    return _build_columns(catalog.version, catalog)
@@ -0,0 +1,57 @@
+"""Memoized HTML/markdown fragments for the parts of the page that rarely change"""
+import threading
+from collections import OrderedDict
+
+import metrics
+from config import config_version
+
+
+class FragmentCache:
+    """LRU cache of rendered strings keyed on name, config and catalog versions"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, build, config_version=0, catalog_version=0, key=()):
+        """Return the cached fragment, calling build() to render it on a miss"""
+        cache_key = (name, config_version, catalog_version, key)
+        with self._lock:
+            value = self._entries.get(cache_key)
+            if value is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build()
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+fragments = FragmentCache()
+metrics.register_collector("fragments", fragments.stats)
+
+
+def fragment(name, build, catalog_version=0, key=()):
+    """Cached fragment for the current config version (see FragmentCache.get).
+
+    Only for output that is computed (cards, grids, text built from config);
+    constant strings are cheaper passed to st.markdown as they are.
+    """
+    return fragments.get(name, build, config_version=config_version(),
+                         catalog_version=catalog_version, key=key)
@@ -0,0 +1,221 @@
+"""Town gazetteer and a grid index for proximity queries over listings"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Mapping, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 110.57
+KM_PER_DEGREE_LON = 111.32
+
+# Grid cell edge in km; about the radius of the typical "near X" query
+CELL_KM = 10.0
+
+# Approximate town-centre coordinates (lat, lon) for Himachal Pradesh
+GAZETTEER = {
+    "Arki": (31.1517, 76.9654),
+    "Baddi": (30.9578, 76.7914),
+    "Barog": (30.8880, 77.0790),
+    "Bhuntar": (31.8767, 77.1447),
+    "Bilaspur": (31.3390, 76.7600),
+    "Bir": (32.0440, 76.7200),
+    "Chail": (30.9654, 77.1986),
+    "Chamba": (32.5534, 76.1258),
+    "Dalhousie": (32.5387, 75.9710),
+    "Dharamshala": (32.2190, 76.3234),
+    "Hamirpur": (31.6862, 76.5213),
+    "Jogindernagar": (31.9872, 76.7889),
+    "Kandaghat": (30.9650, 77.1150),
+    "Kangra": (32.0998, 76.2691),
+    "Kasauli": (30.8986, 76.9656),
+    "Kasol": (32.0100, 77.3150),
+    "Kaza": (32.2276, 78.0710),
+    "Keylong": (32.5710, 77.0325),
+    "Kufri": (31.0979, 77.2678),
+    "Kullu": (31.9579, 77.1095),
+    "Manali": (32.2432, 77.1892),
+    "Mandi": (31.7088, 76.9320),
+    "Mashobra": (31.1320, 77.2290),
+    "McLeod Ganj": (32.2426, 76.3213),
+    "Nahan": (30.5596, 77.2961),
+    "Nalagarh": (31.0425, 76.7232),
+    "Naldehra": (31.1600, 77.1900),
+    "Narkanda": (31.2573, 77.4582),
+    "Nurpur": (32.3000, 75.8833),
+    "Palampur": (32.1109, 76.5363),
+    "Paonta Sahib": (30.4380, 77.6240),
+    "Parwanoo": (30.8372, 76.9615),
+    "Rampur": (31.4494, 77.6300),
+    "Reckong Peo": (31.5382, 78.2707),
+    "Rohru": (31.2046, 77.7512),
+    "Shimla": (31.1048, 77.1734),
+    "Solan": (30.9045, 77.0967),
+    "Sundernagar": (31.5332, 76.8923),
+    "Theog": (31.1193, 77.3577),
+    "Una": (31.4685, 76.2708),
+}
+
+# Longest names first, so "McLeod Ganj" wins over a shorter overlapping name
+_TOWN_RE = re.compile(
+    r"\b(%s)\b" % "|".join(re.escape(name) for name in sorted(GAZETTEER, key=len, reverse=True)),
+    re.IGNORECASE,
+)
+_TOWN_BY_KEY = {name.lower(): name for name in GAZETTEER}
+
+
+def find_town(text) -> Optional[str]:
+    """First gazetteer town named in free text (a location or an address)"""
+    match = _TOWN_RE.search(text or "")
+    return _TOWN_BY_KEY[match.group(1).lower()] if match else None
+
+
+def locate(text) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of the town named in text, or None if it isn't in the gazetteer"""
+    town = find_town(text)
+    return GAZETTEER[town] if town else None
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+@dataclass(frozen=True, eq=False)
+class SpatialIndex:
+    """Uniform grid over the listings that have coordinates.
+
+    Points are projected to km with the cosine of the northernmost latitude
+    (less 1% slack), which never overstates a distance, so a cell search of
+    radius r finds every point within r km. Candidates are then checked with
+    the exact great-circle distance. Indices returned are catalog positions.
+    """
+    version: int
+    positions: np.ndarray
+    lats: np.ndarray
+    lons: np.ndarray
+    lon_scale: float
+    cells: Mapping[Tuple[int, int], np.ndarray] = field(default_factory=dict)
+    extent: Tuple[int, int, int, int] = (0, -1, 0, -1)
+
+    @classmethod
+    def build(cls, catalog):
+        located = [(i, item.latitude, item.longitude) for i, item in enumerate(catalog.listings)
+                   if item.latitude is not None and item.longitude is not None]
+        positions = np.array([i for i, _, _ in located], dtype=np.int64)
+        lats = np.array([lat for _, lat, _ in located], dtype=np.float64)
+        lons = np.array([lon for _, _, lon in located], dtype=np.float64)
+        north = math.radians(np.abs(lats).max()) if len(lats) else 0.0
+        lon_scale = 0.99 * KM_PER_DEGREE_LON * math.cos(north)
+        x, y = lons * lon_scale, lats * KM_PER_DEGREE_LAT
+        cx, cy = np.floor(x / CELL_KM).astype(np.int64), np.floor(y / CELL_KM).astype(np.int64)
+        # Group point offsets by cell: one sort, then split on cell boundaries
+        order = np.lexsort((cy, cx))
+        cells = {}
+        if len(order):
+            keys = np.stack([cx[order], cy[order]], axis=1)
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0), axis=1)) + 1
+            for group in np.split(order, starts):
+                group.setflags(write=False)
+                cells[(int(cx[group[0]]), int(cy[group[0]]))] = group
+        extent = (int(cx.min()), int(cx.max()), int(cy.min()), int(cy.max())) if len(order) else (0, -1, 0, -1)
+        return cls(catalog.version, positions, lats, lons, lon_scale, cells, extent)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, lat, lon):
+        return math.floor(lon * self.lon_scale / CELL_KM), math.floor(lat * KM_PER_DEGREE_LAT / CELL_KM)
+
+    def _gather(self, cells):
+        found = [self.cells[key] for key in cells if key in self.cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def within(self, lat, lon, radius_km):
+        """(catalog indices, distances in km) of listings within radius, nearest first"""
+        x0, y0 = lon * self.lon_scale, lat * KM_PER_DEGREE_LAT
+        min_x, max_x, min_y, max_y = self.extent
+        xs = range(max(min_x, math.floor((x0 - radius_km) / CELL_KM)),
+                   min(max_x, math.floor((x0 + radius_km) / CELL_KM)) + 1)
+        ys = range(max(min_y, math.floor((y0 - radius_km) / CELL_KM)),
+                   min(max_y, math.floor((y0 + radius_km) / CELL_KM)) + 1)
+        offsets = self._gather((cx, cy) for cx in xs for cy in ys)
+        distances = haversine_km(lat, lon, self.lats[offsets], self.lons[offsets])
+        keep = distances <= radius_km
+        offsets, distances = offsets[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return self.positions[offsets[order]], distances[order]
+
+    def nearest(self, lat, lon, k, exclude=None):
+        """(catalog indices, distances in km) of the k listings nearest to a point.
+
+        Searches rings of cells outwards and stops once the k-th distance is
+        no further than the ring already covered.
+        """
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        cx, cy = self._cell(lat, lon)
+        min_x, max_x, min_y, max_y = self.extent
+        max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        found, ring = [], 0
+        while True:
+            if ring == 0:
+                cells = [(cx, cy)]
+            else:
+                cells = [(x, y) for x in range(cx - ring, cx + ring + 1) for y in (cy - ring, cy + ring)]
+                cells += [(x, y) for x in (cx - ring, cx + ring) for y in range(cy - ring + 1, cy + ring)]
+            offsets = self._gather(cells)
+            if exclude is not None and len(offsets):
+                offsets = offsets[self.positions[offsets] != exclude]
+            found.append(offsets)
+            candidates = np.concatenate(found)
+            if len(candidates) >= k or ring >= max_ring:
+                distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+                order = np.argsort(distances, kind="stable")[:k]
+                if ring >= max_ring or distances[order[-1]] <= ring * CELL_KM:
+                    return self.positions[candidates[order]], distances[order]
+            ring += 1
+
+    def point(self, index) -> Optional[Tuple[float, float]]:
+        """(lat, lon) of the listing at catalog index, if it has coordinates"""
+        offset = np.searchsorted(self.positions, index)
+        if offset < len(self.positions) and self.positions[offset] == index:
+            return float(self.lats[offset]), float(self.lons[offset])
+        return None
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_index(version, _catalog):
+    return SpatialIndex.build(_catalog)
+
+
+def get_spatial_index(catalog) -> SpatialIndex:
+    """Spatial index for a catalog, built once per catalog version"""
+    return _build_index(catalog.version, catalog)
+
+
+def similar_nearby(index, columns, position, k=3, radius_km=50.0):
+    """Catalog indices and distances of listings near one listing that share its features and price band.
+
+    Candidates within radius_km are ranked by shared feature flags, then by
+    distance; priced listings must be within half to double this one's price.
+    """
+    point = index.point(position)
+    if point is None:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    candidates, distances = index.within(*point, radius_km)
+    keep = candidates != position
+    if columns.has_price[position]:
+        price = columns.price_min[position]
+        other = columns.price_min[candidates]
+        keep &= ~columns.has_price[candidates] | ((other >= price / 2) & (other <= price * 2))
+    candidates, distances = candidates[keep], distances[keep]
+    common = np.ascontiguousarray(columns.features[candidates] & columns.features[position])
+    shared = np.unpackbits(common.view(np.uint8)).reshape(len(common), 64).sum(axis=1, dtype=np.int64)
+    order = np.lexsort((distances, -shared))[:k]
+    return candidates[order], distances[order]
@@ -0,0 +1,283 @@
+"""Resized, locally served image derivatives with a content-hashed disk cache"""
+import hashlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from html import escape
+from pathlib import Path
+
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+# Served by Streamlit at app/static/img/ (server.enableStaticServing).
+# IMAGE_CACHE_DIR and IMAGE_SOURCE_DIR override these for tools such as
+# bench.py; derivatives outside static/img are not served by the app.
+DERIVATIVE_DIR = BASE_DIR / "static" / "img"
+DERIVATIVE_URL = "app/static/img"
+SOURCE_DIR = BASE_DIR / "data" / "images"
+
+DEFAULT_CACHE_BYTES = 200 * 1024 * 1024
+# Seconds before retrying an image whose download or resize failed
+RETRY_AFTER = 300
+# Don't rewrite a derivative's mtime (its LRU timestamp) more often than this
+TOUCH_INTERVAL = 3600
+
+# (width, height) for each place an image is shown; height None keeps the
+# aspect ratio. The second size of each preset is for 2x displays.
+PRESETS = {
+    "card": ((600, 200), (1200, 400)),    # Home cards: 200px high, object-fit: cover
+    "column": ((400, None), (800, None)),  # one-third column on Properties/About
+    "thumb": ((160, 120), (320, 240)),     # compact cards in the paginated listing
+}
+SIZES_ATTR = {
+    "card": "(max-width: 768px) 100vw, 600px",
+    "column": "(max-width: 768px) 100vw, 400px",
+    "thumb": "160px",
+}
+FORMATS = (("webp", "WEBP", {"quality": 80, "method": 6}),
+           ("jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}))
+
+
+@dataclass(frozen=True)
+class Derivative:
+    path: Path
+    width: int
+    height: int
+    format: str
+
+    @property
+    def url(self):
+        return f"{DERIVATIVE_URL}/{self.path.name}"
+
+
+_lock = threading.Lock()
+_resolved = {}
+_touched = {}
+_pending = set()
+_failed = {}
+# Bumped whenever derivatives appear or disappear, so cached markup can be rebuilt
+_generation = 0
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="images")
+
+
+def derivatives_version():
+    """Counter that changes whenever image_html() output may change"""
+    return _generation
+
+
+def _cache_budget():
+    return get_snapshot().get_int('IMAGE_CACHE_BYTES', DEFAULT_CACHE_BYTES)
+
+
+def _derivative_dir():
+    return Path(get_snapshot().get_str('IMAGE_CACHE_DIR') or DERIVATIVE_DIR)
+
+
+def _source_dir():
+    return Path(get_snapshot().get_str('IMAGE_SOURCE_DIR') or SOURCE_DIR)
+
+
+def _source_path(url):
+    return _source_dir() / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def fetch_source(url):
+    """Original image bytes, downloaded once and kept under data/images"""
+    path = _source_path(url)
+    if path.exists():
+        return path.read_bytes()
+    import requests
+    response = requests.get(url, timeout=15)
+    response.raise_for_status()
+    return ingest(url, response.content)
+
+
+def _write(path, data):
+    # A unique temp name per writer: a wait=True build and the executor may
+    # write the same file at once
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as tmp:
+        try:
+            tmp.write(data)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+
+
+def ingest(url, data):
+    """Store image bytes as the source for url (e.g. an uploaded photo)"""
+    path = _source_path(url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write(path, data)
+    with _lock:
+        _failed.pop(url, None)
+    return data
+
+
+def _resize(image, width, height):
+    from PIL import Image, ImageOps
+    if height is None:
+        if image.width <= width:
+            return image.copy()
+        height = round(image.height * width / image.width)
+        return image.resize((width, height), Image.LANCZOS)
+    return ImageOps.fit(image, (width, height), Image.LANCZOS)
+
+
+def build_derivatives(data, preset):
+    """Write the resized WebP/JPEG files for a preset; returns them by format"""
+    # Pillow loads with the first image build, not with the page
+    from PIL import Image, ImageOps
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    directory = _derivative_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    results = {ext: [] for ext, _, _ in FORMATS}
+    image = None
+    for width, height in PRESETS[preset]:
+        for ext, pil_format, options in FORMATS:
+            name = f"{digest}-{width}x{height or 'auto'}.{ext}"
+            path = directory / name
+            if not path.exists():
+                if image is None:
+                    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+                resized = _resize(image, width, height)
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                _write(path, buffer.getvalue())
+                size = resized.size
+            else:
+                with Image.open(path) as existing:
+                    size = existing.size
+            results[ext].append(Derivative(path, size[0], size[1], ext))
+    return results
+
+
+def evict(budget=None):
+    """Delete least recently used derivatives until the cache fits the byte budget"""
+    budget = _cache_budget() if budget is None else budget
+    entries = []
+    total = 0
+    directory = _derivative_dir()
+    for entry in os.scandir(directory) if directory.exists() else ():
+        # Skip files still being written
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    if total <= budget:
+        return 0
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= budget:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    global _generation
+    with _lock:
+        for key, derivatives in list(_resolved.items()):
+            if not all(item.path.exists() for items in derivatives.values() for item in items):
+                _resolved.pop(key)
+                _touched.pop(key, None)
+                _generation += 1
+    return removed
+
+
+def _prepare(url, preset):
+    global _generation
+    try:
+        derivatives = build_derivatives(fetch_source(url), preset)
+    except Exception as e:
+        logger.warning("Could not build %s derivatives for %s: %s", preset, url, e)
+        derivatives = None
+    with _lock:
+        _pending.discard((url, preset))
+        if derivatives:
+            _resolved[(url, preset)] = derivatives
+            _generation += 1
+        else:
+            _failed[url] = time.monotonic()
+    if derivatives:
+        evict()
+    return derivatives
+
+
+def get_derivatives(url, preset, wait=False):
+    """Local derivatives for an image, or None while they are still being built"""
+    key = (url, preset)
+    with _lock:
+        derivatives = _resolved.get(key)
+        if derivatives is None and not wait:
+            failed_at = _failed.get(url)
+            if failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER:
+                return None
+            if key not in _pending:
+                _pending.add(key)
+                _executor.submit(_prepare, url, preset)
+            return None
+    if derivatives is None:
+        return _prepare(url, preset)
+
+    # Mark as recently used for LRU eviction, at most once per TOUCH_INTERVAL
+    now = time.time()
+    if now - _touched.get(key, 0) > TOUCH_INTERVAL:
+        try:
+            for items in derivatives.values():
+                for item in items:
+                    os.utime(item.path)
+        except FileNotFoundError:
+            global _generation
+            with _lock:
+                _resolved.pop(key, None)
+                _generation += 1
+            return get_derivatives(url, preset, wait)
+        _touched[key] = now
+    return derivatives
+
+
+def image_html(url, preset, alt="", style="", wait=False, base_url=DERIVATIVE_URL):
+    """<picture> markup with WebP/JPEG srcsets, falling back to the original URL.
+
+    base_url is where the derivative files are served from (the static site
+    copies them next to its pages).
+    """
+    derivatives = get_derivatives(url, preset, wait=wait)
+    style_attr = f' style="{escape(style)}"' if style else ""
+    if not derivatives:
+        return f'<img src="{escape(url)}" alt="{escape(alt)}" loading="lazy"{style_attr}>'
+    sizes = SIZES_ATTR[preset]
+
+    def srcset(items):
+        return ", ".join(f"{base_url}/{item.path.name} {item.width}w" for item in items)
+
+    webp, jpeg = derivatives["webp"], derivatives["jpg"]
+    return (
+        f'<picture><source type="image/webp" srcset="{srcset(webp)}" sizes="{sizes}">'
+        f'<img src="{base_url}/{jpeg[0].path.name}" srcset="{srcset(jpeg)}" sizes="{sizes}" '
+        f'width="{jpeg[0].width}" height="{jpeg[0].height}" alt="{escape(alt)}" '
+        f'loading="lazy"{style_attr}></picture>'
+    )
+
+
+if __name__ == "__main__":
+    # python images.py warm  -- pre-build derivatives for every catalog listing
+    if sys.argv[1:] == ["warm"]:
+        from catalog import get_catalog
+        for listing in get_catalog().listings:
+            for preset in PRESETS:
+                get_derivatives(listing.image_url, preset, wait=True)
+        print(f"Evicted {evict()} files")
+    else:
+        print("usage: python images.py warm")
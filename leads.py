@@ -0,0 +1,283 @@
+"""Lead-quality checks on enquiry email domains, run off the request path"""
+import importlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+import metrics
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Big mailbox providers: well known, so never looked up
+WELL_KNOWN_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "yahoo.com", "yahoo.co.in", "outlook.com", "hotmail.com",
+    "live.com", "icloud.com", "me.com", "rediffmail.com", "protonmail.com", "proton.me", "zoho.com",
+})
+
+# Throwaway inbox services
+DISPOSABLE_DOMAINS = frozenset({
+    "mailinator.com", "guerrillamail.com", "10minutemail.com", "tempmail.com", "temp-mail.org",
+    "yopmail.com", "trashmail.com", "sharklasers.com", "getnada.com", "dispostable.com",
+})
+
+
+@dataclass(frozen=True)
+class LeadCheck:
+    """Score (0-100) for an enquiry's email address and the reasons behind it"""
+    domain: str
+    score: int
+    reasons: Tuple[str, ...] = ()
+    deliverable: Optional[bool] = None
+    domain_age_days: Optional[int] = None
+    checked_at: float = field(default_factory=time.time)
+
+    def detail(self):
+        """Compact JSON for the enquiry log"""
+        return json.dumps({
+            "domain": self.domain, "score": self.score, "reasons": list(self.reasons),
+            "deliverable": self.deliverable, "domain_age_days": self.domain_age_days,
+        })
+
+    def summary(self):
+        return f"{self.score}/100" + (f" ({', '.join(self.reasons)})" if self.reasons else "")
+
+
+@dataclass(frozen=True)
+class DomainFacts:
+    """What a resolver found out about a domain; None means unknown"""
+    deliverable: Optional[bool] = None
+    created: Optional[datetime] = None
+
+
+class NetworkResolver:
+    """MX/A lookups through email-validator and registration dates through WHOIS"""
+
+    def __init__(self, timeout=5.0, whois_lookups=True):
+        self.timeout = timeout
+        self.whois_lookups = whois_lookups
+
+    def lookup(self, domain):
+        return DomainFacts(deliverable=self._deliverable(domain),
+                           created=self._created(domain) if self.whois_lookups else None)
+
+    def _deliverable(self, domain):
+        from email_validator import EmailUndeliverableError
+        from email_validator.deliverability import validate_email_deliverability
+        try:
+            info = validate_email_deliverability(domain, domain, timeout=self.timeout)
+        except EmailUndeliverableError:
+            return False
+        return None if "unknown-deliverability" in info else True
+
+    def _created(self, domain):
+        import whois
+        try:
+            created = whois.whois(domain).creation_date
+        except Exception as e:
+            logger.debug("WHOIS lookup for %s failed: %s", domain, e)
+            return None
+        if isinstance(created, (list, tuple)):
+            created = min((value for value in created if isinstance(value, datetime)), default=None)
+        return created if isinstance(created, datetime) else None
+
+
+class StubResolver:
+    """Offline resolver answering from fixed tables (tests, CI, no network)"""
+
+    def __init__(self, deliverable=None, created=None):
+        self.deliverable = dict(deliverable or {})
+        self.created = dict(created or {})
+        self.lookups = 0
+
+    def lookup(self, domain):
+        self.lookups += 1
+        return DomainFacts(self.deliverable.get(domain), self.created.get(domain))
+
+
+def score_domain(domain, facts, now=None):
+    """Turn what is known about a domain into a LeadCheck"""
+    if domain in DISPOSABLE_DOMAINS:
+        return LeadCheck(domain, 5, ("disposable address",), deliverable=facts.deliverable)
+    if domain in WELL_KNOWN_DOMAINS:
+        return LeadCheck(domain, 80, ("mail provider",), deliverable=True)
+    if facts.deliverable is False:
+        return LeadCheck(domain, 10, ("domain has no mail server",), deliverable=False)
+    score, reasons = 50, []
+    if facts.deliverable:
+        score += 25
+    age_days = None
+    if facts.created is not None:
+        created = facts.created if facts.created.tzinfo else facts.created.replace(tzinfo=timezone.utc)
+        age_days = max(0, ((now or datetime.now(timezone.utc)) - created).days)
+        if age_days < 30:
+            score -= 35
+            reasons.append(f"domain registered {age_days} days ago")
+        elif age_days >= 365:
+            score += 25
+    return LeadCheck(domain, max(0, min(100, score)), tuple(reasons),
+                     deliverable=facts.deliverable, domain_age_days=age_days)
+
+
+class TTLCache:
+    """LRU cache whose entries also expire `ttl` seconds after being stored"""
+
+    def __init__(self, max_entries=4096, ttl=86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _domain(email):
+    return email.rpartition("@")[2].strip().lower().rstrip(".")
+
+
+class LeadChecker:
+    """Scores enquiry emails on a bounded pool of worker threads.
+
+    Results are cached per domain (TTL + LRU), concurrent checks of the same
+    domain share one lookup, and well-known or disposable domains are scored
+    without any lookup at all. When more than `backlog` lookups are waiting,
+    new ones are skipped and scored as unknown rather than queued.
+    """
+
+    def __init__(self, resolver, workers=4, backlog=100, cache=None):
+        self.resolver = resolver
+        self.cache = cache if cache is not None else TTLCache()
+        self.backlog = backlog
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lead-check")
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._idle = threading.Condition(self._lock)
+
+    def check(self, email, callback):
+        """Score email and call callback(LeadCheck), possibly from a worker thread"""
+        with self._lock:
+            self._outstanding += 1
+        future = self._lookup(email)
+        future.add_done_callback(lambda done: self._deliver(done, callback))
+
+    def _deliver(self, future, callback):
+        try:
+            callback(future.result())
+        except Exception:
+            logger.exception("Lead check callback failed")
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Wait until every check so far has reached its callback; False on timeout"""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _lookup(self, email):
+        from email_validator import EmailNotValidError, validate_email
+        try:
+            domain = validate_email(email, check_deliverability=False).ascii_domain.lower()
+        except EmailNotValidError as e:
+            return self._done(LeadCheck(_domain(email), 0, (f"invalid address: {e}",)))
+        if domain in WELL_KNOWN_DOMAINS or domain in DISPOSABLE_DOMAINS:
+            return self._done(score_domain(domain, DomainFacts()))
+        # The cache and in-flight lookups are checked under one lock, and a
+        # finished lookup moves from one to the other under it too, so each
+        # domain is looked up once however many enquiries arrive together
+        with self._lock:
+            cached = self.cache.get(domain)
+            if cached is not None:
+                metrics.incr("leads.cache_hits")
+                return self._done(cached)
+            future = self._inflight.get(domain)
+            if future is not None:
+                metrics.incr("leads.shared_lookups")
+                return future
+            if len(self._inflight) >= self.backlog:
+                metrics.incr("leads.skipped")
+                return self._done(LeadCheck(domain, 50, ("not checked: busy",)))
+            metrics.incr("leads.lookups")
+            future = self._executor.submit(self._resolve, domain)
+            self._inflight[domain] = future
+        return future
+
+    def _resolve(self, domain):
+        try:
+            with metrics.timer("leads.lookup"):
+                facts = self.resolver.lookup(domain)
+            result = score_domain(domain, facts)
+        except Exception as e:
+            logger.warning("Lead check for %s failed: %s", domain, e)
+            with self._lock:
+                self._inflight.pop(domain, None)
+            return LeadCheck(domain, 50, ("not checked: lookup failed",))
+        with self._lock:
+            self.cache.put(domain, result)
+            self._inflight.pop(domain, None)
+        return result
+
+    @staticmethod
+    def _done(result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+
+def make_resolver(name, timeout=5.0):
+    """"dns" (default), "stub", or "package.module:factory" for a custom resolver"""
+    if name in ("", "dns"):
+        return NetworkResolver(timeout=timeout)
+    if name == "stub":
+        return StubResolver()
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr or "resolver")()
+
+
+_checker = None
+_lock = threading.Lock()
+
+
+def get_lead_checker():
+    """Process-wide checker (LEAD_RESOLVER, LEAD_CHECK_WORKERS, LEAD_CACHE_TTL)"""
+    global _checker
+    if _checker is None:
+        with _lock:
+            if _checker is None:
+                config = get_snapshot()
+                _checker = LeadChecker(
+                    make_resolver(config.get_str('LEAD_RESOLVER', "dns"), config.get_float('LEAD_CHECK_TIMEOUT', 5.0)),
+                    workers=config.get_int('LEAD_CHECK_WORKERS', 4),
+                    backlog=config.get_int('LEAD_CHECK_BACKLOG', 100),
+                    cache=TTLCache(max_entries=config.get_int('LEAD_CACHE_SIZE', 4096),
+                                   ttl=config.get_float('LEAD_CACHE_TTL', 86400.0)),
+                )
+    return _checker
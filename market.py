@@ -0,0 +1,341 @@
+"""Per-district market rollups, kept up to date from the listing event log.
+
+Each district keeps quantile sketches of the ₹/sq.ft. rate and the asking
+price of its active listings. Each (month, district) keeps sketches of the
+rates listed and the rates sold at, plus event counts. Events are folded in
+as they arrive, so catching up costs time in proportion to the new events,
+not to the whole history. The rollups are checkpointed next to the catalog
+store, so a restart replays only the events since the checkpoint.
+"""
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import metrics
+from catalog import get_db_path, last_event_id, listing_events
+from parsing import AREA_UNITS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout below changes; older checkpoints are then rebuilt from the log
+ROLLUP_VERSION = 1
+
+# Every quantile a sketch reports is within ALPHA of a true sample value
+ALPHA = 0.02
+_GAMMA = (1 + ALPHA) / (1 - ALPHA)
+_LOG_GAMMA = math.log(_GAMMA)
+# Values from ₹1 to ₹10,000 Crore fit; anything outside is clamped to the end buckets
+MIN_VALUE, MAX_VALUE = 1.0, 1e11
+BINS = math.ceil(math.log(MAX_VALUE / MIN_VALUE) / _LOG_GAMMA) + 1
+# Bucket i holds (MIN_VALUE * γ^(i-1), MIN_VALUE * γ^i]; this is its representative value
+_VALUES = MIN_VALUE * 2 * _GAMMA ** np.arange(BINS) / (_GAMMA + 1)
+
+SQFT_PER_ACRE = AREA_UNITS["acre"]
+ALL_DISTRICTS = "All districts"
+
+# Sketches and counters of the two tables
+RATE, PRICE = 0, 1
+ACTIVE, SOLD = 0, 1
+LISTED, SOLD_AT = 0, 1
+ADDED, REPRICED, MONTH_SOLD, REMOVED = range(4)
+
+# Histogram bands in ₹/sq.ft.
+BAND_EDGES = np.array([100, 200, 500, 1000, 1500, 2000, 3000, 5000, 10000], dtype=np.float64)
+_BAND_OF_BUCKET = np.searchsorted(BAND_EDGES, _VALUES, side="right")
+
+
+def buckets(values):
+    """Sketch bucket of each value"""
+    values = np.clip(np.asarray(values, dtype=np.float64), MIN_VALUE, MAX_VALUE)
+    return np.clip(np.ceil(np.log(values / MIN_VALUE) / _LOG_GAMMA), 0, BINS - 1).astype(np.intp)
+
+
+def quantiles(counts, qs):
+    """Values at quantiles qs of a sketch (one row of bucket counts); None when it is empty"""
+    cumulative = np.cumsum(np.maximum(counts, 0))
+    total = int(cumulative[-1])
+    if not total:
+        return [None] * len(qs)
+    # Nearest rank, counting from 0
+    ranks = np.floor(np.asarray(qs, dtype=np.float64) * (total - 1) + 0.5)
+    return _VALUES[np.searchsorted(cumulative, ranks, side="right")].tolist()
+
+
+def format_rupees(value):
+    """₹ amount in Crores, Lakhs or plain rupees"""
+    if value >= 1e7:
+        return f"₹{value / 1e7:.3g} Cr"
+    if value >= 1e5:
+        return f"₹{value / 1e5:.3g} L"
+    return f"₹{value:,.0f}"
+
+
+def band_labels(scale=1.0):
+    """Labels of the histogram bands, with edges multiplied by scale (SQFT_PER_ACRE for ₹/acre)"""
+    edges = [format_rupees(edge * scale) for edge in BAND_EDGES]
+    return [f"< {edges[0]}"] + [f"{low}–{high}" for low, high in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+
+
+class SketchTable:
+    """Keyed rows of quantile sketches and counters, stored in two growable arrays.
+
+    sketches is int32 (rows, kinds, BINS) and counters int64 (rows, counters);
+    rows past len(keys) are spare capacity.
+    """
+
+    def __init__(self, kinds, counters, keys=(), sketches=None, totals=None):
+        self.keys = list(keys)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        self.sketches = sketches if sketches is not None else np.zeros((0, kinds, BINS), dtype=np.int32)
+        self.counters = totals if totals is not None else np.zeros((0, counters), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, keys):
+        """Row of each key, adding rows for keys not seen before"""
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self.index.get(key)
+            if row is None:
+                row = self.index[key] = len(self.keys)
+                self.keys.append(key)
+            rows[i] = row
+        if len(self.keys) > len(self.sketches):
+            capacity = max(8, 2 * len(self.keys))
+            self.sketches = _grow(self.sketches, capacity)
+            self.counters = _grow(self.counters, capacity)
+        return rows
+
+    def add(self, rows, kind, values, sign):
+        """Add (sign=1) or remove (sign=-1) values from the kind sketch of each row; NaNs are skipped"""
+        valid = np.isfinite(values) & (values > 0)
+        np.add.at(self.sketches, (rows[valid], kind, buckets(values[valid])), sign)
+
+    def count(self, rows, counter, sign):
+        np.add.at(self.counters, (rows, counter), sign)
+
+    def sketch(self, rows, kind):
+        """One sketch merging the kind sketches of rows"""
+        return self.sketches[rows, kind].sum(axis=0, dtype=np.int64)
+
+    def state(self, prefix):
+        n = len(self.keys)
+        columns = list(zip(*self.keys)) if self.keys else []
+        state = {f"{prefix}_key{i}": np.array(column) for i, column in enumerate(columns)}
+        state[f"{prefix}_sketches"] = self.sketches[:n]
+        state[f"{prefix}_counters"] = self.counters[:n]
+        return state
+
+    @classmethod
+    def from_state(cls, state, prefix, arity):
+        columns = [state[f"{prefix}_key{i}"].tolist() for i in range(arity)] if f"{prefix}_key0" in state else []
+        keys = list(zip(*columns)) if columns else []
+        sketches, counters = state[f"{prefix}_sketches"], state[f"{prefix}_counters"]
+        return cls(sketches.shape[1], counters.shape[1], keys, sketches.copy(), counters.copy())
+
+
+def _grow(array, capacity):
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def _column(events, name):
+    # Missing values (None) become NaN
+    return np.array([row[name] for row in events], dtype=np.float64)
+
+
+class MarketRollups:
+    """Current per-district sketches and per-month activity, folded from listing events"""
+
+    def __init__(self, current=None, monthly=None, last_event=0):
+        # current: (district,) -> rate/price sketches of active listings; active/sold counts
+        self.current = current or SketchTable(2, 2)
+        # monthly: (month, district) -> listed/sold-at rate sketches; added/repriced/sold/removed
+        self.monthly = monthly or SketchTable(2, 4)
+        self.last_event = last_event
+
+    def apply(self, events):
+        """Fold listing_events rows (in id order) into the rollups"""
+        if not events:
+            return
+        kind = np.array([row["event"] for row in events])
+        district = [(row["district"],) for row in events]
+        old_district = [(row["old_district"] or row["district"],) for row in events]
+        rate, price = _column(events, "rate"), _column(events, "price")
+        old_rate, old_price = _column(events, "old_rate"), _column(events, "old_price")
+        # Months since 1970-01
+        months = np.array([row["at"] for row in events], dtype=np.int64).astype("datetime64[s]")
+        months = months.astype("datetime64[M]").astype(np.int64).tolist()
+
+        added, repriced = kind == "add", kind == "reprice"
+        sold, removed = kind == "sold", kind == "remove"
+        entering, leaving = added | repriced, sold | removed
+
+        current, monthly = self.current, self.monthly
+        rows, old_rows = current.rows(district), current.rows(old_district)
+        # A repriced listing leaves its old values (and district) and enters with the new ones
+        current.add(old_rows[repriced], RATE, old_rate[repriced], -1)
+        current.add(old_rows[repriced], PRICE, old_price[repriced], -1)
+        current.count(old_rows[repriced], ACTIVE, -1)
+        current.add(rows[entering], RATE, rate[entering], 1)
+        current.add(rows[entering], PRICE, price[entering], 1)
+        current.count(rows[entering], ACTIVE, 1)
+        # Sold and removed events carry the values the listing had while active
+        current.add(rows[leaving], RATE, rate[leaving], -1)
+        current.add(rows[leaving], PRICE, price[leaving], -1)
+        current.count(rows[leaving], ACTIVE, -1)
+        current.count(rows[sold], SOLD, 1)
+
+        month_rows = monthly.rows(list(zip(months, (d for d, in district))))
+        monthly.add(month_rows[entering], LISTED, rate[entering], 1)
+        monthly.add(month_rows[sold], SOLD_AT, rate[sold], 1)
+        for mask, counter in ((added, ADDED), (repriced, REPRICED), (sold, MONTH_SOLD), (removed, REMOVED)):
+            monthly.count(month_rows[mask], counter, 1)
+        self.last_event = events[-1]["id"]
+
+    def catch_up(self, path):
+        """Apply the events logged since the last one applied; returns how many there were"""
+        events = listing_events(self.last_event, path)
+        with metrics.timer("market.catch_up"):
+            self.apply(events)
+        metrics.incr("market.events", len(events))
+        return len(events)
+
+    @property
+    def districts(self):
+        return sorted(district for district, in self.current.keys)
+
+    def save(self, path):
+        """Write a checkpoint (atomically) to path"""
+        path = Path(path)
+        state = {"version": np.array([ROLLUP_VERSION, BINS]), "last_event": np.array(self.last_event)}
+        state.update(self.current.state("current"))
+        state.update(self.monthly.state("monthly"))
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **state)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Rollups from a checkpoint; empty ones if it is missing, unreadable or from another layout"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                state = dict(data)
+        except (OSError, ValueError) as e:
+            if Path(path).exists():
+                logger.warning("Ignoring market rollup checkpoint %s: %s", path, e)
+            return cls()
+        if state["version"].tolist() != [ROLLUP_VERSION, BINS]:
+            return cls()
+        return cls(SketchTable.from_state(state, "current", 1), SketchTable.from_state(state, "monthly", 2),
+                   int(state["last_event"]))
+
+
+def checkpoint_path(db_path):
+    """Rollup checkpoint kept beside a catalog store (data/catalog.rollups.npz)"""
+    return Path(db_path).with_suffix(".rollups.npz")
+
+
+_rollups = {}
+_lock = threading.Lock()
+
+
+def _caught_up(path):
+    # Call with _lock held
+    rollups = _rollups.get(path)
+    if rollups is None:
+        rollups = _rollups[path] = MarketRollups.load(checkpoint_path(path))
+    if last_event_id(path) < rollups.last_event:
+        # The store was replaced by one with a shorter log: start over
+        rollups = _rollups[path] = MarketRollups()
+    if rollups.catch_up(path):
+        rollups.save(checkpoint_path(path))
+    return rollups
+
+
+@dataclass(frozen=True, eq=False)
+class MarketView:
+    """Everything the Market Insights page shows, computed once per catalog version"""
+    version: int
+    # One row per district: active listings, rate quartiles, per-acre and price medians, sold
+    summary: pd.DataFrame
+    # District (and ALL_DISTRICTS) -> active listings per rate band, labelled per sq.ft. and per acre
+    histograms: Mapping[str, pd.DataFrame]
+    # Median listed ₹/sq.ft. per month (index) and district (columns, with ALL_DISTRICTS)
+    trends: pd.DataFrame
+    # District -> (median listed rate over the last 3 months, same 3 months a year earlier)
+    changes: Mapping[str, Tuple[Optional[float], Optional[float]]]
+
+    @property
+    def districts(self):
+        return list(self.histograms)
+
+    @classmethod
+    def build(cls, version, rollups):
+        current, monthly = rollups.current, rollups.monthly
+        rows, histograms = [], {}
+        districts = rollups.districts
+        labels, acre_labels = band_labels(), band_labels(SQFT_PER_ACRE)
+        for district in districts + [ALL_DISTRICTS]:
+            selected = (np.arange(len(current)) if district == ALL_DISTRICTS
+                        else np.array([current.index[(district,)]]))
+            rates = current.sketch(selected, RATE)
+            active, sold = current.counters[selected].sum(axis=0).tolist()
+            p25, median, p75 = quantiles(rates, (0.25, 0.5, 0.75))
+            price, = quantiles(current.sketch(selected, PRICE), (0.5,))
+            rows.append({
+                "District": district, "Active": active,
+                "Median ₹/sq.ft.": median, "25th pct ₹/sq.ft.": p25, "75th pct ₹/sq.ft.": p75,
+                "Median ₹ Lakhs/acre": median * SQFT_PER_ACRE / 1e5 if median is not None else None,
+                "Median price (₹ Lakhs)": price / 1e5 if price is not None else None,
+                "Sold": sold,
+            })
+            counts = np.bincount(_BAND_OF_BUCKET, weights=np.maximum(rates, 0), minlength=len(BAND_EDGES) + 1)
+            histograms[district] = pd.DataFrame({"band_sqft": labels, "band_acre": acre_labels,
+                                                 "listings": counts.astype(np.int64)})
+        summary = pd.DataFrame(rows).round(1)
+
+        months = sorted({month for month, _ in monthly.keys})
+        by_month = {month: [] for month in months}
+        for (month, _), row in monthly.index.items():
+            by_month[month].append(row)
+        trends, changes = {}, {}
+        for district in districts + [ALL_DISTRICTS]:
+            def rows_in(months):
+                if district == ALL_DISTRICTS:
+                    return [row for month in months for row in by_month.get(month, ())]
+                return [monthly.index[key] for key in ((month, district) for month in months) if key in monthly.index]
+
+            def median(months):
+                rows = rows_in(months)
+                return quantiles(monthly.sketch(rows, LISTED), (0.5,))[0] if rows else None
+            trends[district] = [median([month]) for month in months]
+            # Trailing three months against the same three months a year earlier
+            latest = months[-1] if months else 0
+            changes[district] = (median(range(latest - 2, latest + 1)), median(range(latest - 14, latest - 11)))
+        index = pd.DatetimeIndex(np.array(months, dtype="datetime64[M]"), name="Month")
+        return cls(version, summary, histograms, pd.DataFrame(trends, index=index, dtype=np.float64), changes)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _build_view(version, path):
+    with _lock:
+        rollups = _caught_up(path)
+        with metrics.timer("market.view"):
+            return MarketView.build(version, rollups)
+
+
+def get_market_view(catalog, path=None) -> MarketView:
+    """Market view for a catalog, rebuilt from the rollups only when the catalog version changes"""
+    return _build_view(catalog.version, str(path or get_db_path()))
@@ -0,0 +1,201 @@
+"""HTML and markdown for the static parts of the site"""
+from html import escape
+from textwrap import dedent
+
+from images import image_html
+
+# Site styles; bundle.py minifies them together with the icons
+CSS = """
+    /* Main container */
+    .main {
+        max-width: 1200px;
+        margin: 0 auto;
+        padding: 0 1rem;
+    }
+
+    /* Header */
+    .header {
+        background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
+        color: white;
+        padding: 2rem 0;
+        text-align: center;
+        border-radius: 10px;
+        margin-bottom: 2rem;
+    }
+
+    /* Property cards */
+    .featured-grid {
+        display: grid;
+        grid-template-columns: repeat(2, minmax(0, 1fr));
+        gap: 1rem;
+    }
+
+    .property-card {
+        border-radius: 10px;
+        overflow: hidden;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        transition: transform 0.3s;
+        margin-bottom: 2rem;
+        background: white;
+    }
+
+    .property-card:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 6px 12px rgba(0, 0, 0, 0.15);
+    }
+
+    /* Contact form */
+    .contact-form {
+        background: #f8f9fa;
+        padding: 2rem;
+        border-radius: 10px;
+        margin-top: 2rem;
+    }
+
+    /* Social links (icons come from the bundle as data URIs) */
+    .social-links a {
+        display: inline-block;
+        width: 48px;
+        height: 48px;
+        margin-right: 0.5rem;
+        /* Longhands: the shorthand would reset the icon rules' background-image */
+        background-repeat: no-repeat;
+        background-position: center;
+        background-size: contain;
+    }
+
+    /* Footer */
+    .footer {
+        background: #2c3e50;
+        color: white;
+        padding: 2rem 0;
+        margin-top: 3rem;
+        text-align: center;
+    }
+
+    /* Responsive design */
+    @media (max-width: 768px) {
+        .featured-grid {
+            grid-template-columns: minmax(0, 1fr);
+        }
+        .property-card {
+            margin-bottom: 1.5rem;
+        }
+    }
+"""
+
+HOME_HEADER = """
+<div class="header">
+    <h1>Himachal Land Deals</h1>
+    <p>Your Trusted Partner for Premium Land Deals in Himachal Pradesh</p>
+</div>
+"""
+
+HOME_WELCOME = """
+## Welcome to Himachal Land Deals
+
+Discover the most beautiful and valuable land properties in the serene landscapes of Himachal Pradesh.
+Whether you're looking for a peaceful retreat, an investment opportunity, or your dream home location,
+we have the perfect piece of land for you.
+"""
+
+ABOUT_IMAGE_URL = "https://images.unsplash.com/photo-1501785888041-af3ef285b470?ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D&auto=format&fit=crop&w=1000&q=80"
+
+ABOUT_STORY = """
+## Our Story
+
+Established in 2010, Himachal Land Deals has been a trusted name in the real estate sector of Himachal Pradesh.
+With over a decade of experience, we have helped hundreds of clients find their dream properties in the lap of the Himalayas.
+
+### Why Choose Us?
+- 🏆 12+ Years of Experience
+- 📜 Verified and Clear Titles
+- 🏡 500+ Happy Clients
+- 🏢 50+ Successful Projects
+- 🤝 Transparent Deals
+
+Our team of local experts has in-depth knowledge of the region's real estate market, ensuring you get the best deals
+with complete transparency and legal compliance.
+"""
+
+DEFAULT_CONTACT = {
+    'OFFICE_ADDRESS': 'Solan, By pass road, Near New Bus Stand, Himachal Pradesh',
+    'CONTACT_PHONE': '+91 XXXXXXXXXX',
+    'CONTACT_EMAIL': 'contact@example.com',
+    'WEBSITE_URL': 'www.himachallanddeals.com',
+}
+
+
+def contact_info(config):
+    """Office address, phone, email and website from the config snapshot"""
+    return {key: config.get(key, default) for key, default in DEFAULT_CONTACT.items()}
+
+
+def property_card_html(listing, **image_options):
+    """Home page card for a listing; image_options go to image_html()"""
+    return dedent(f"""
+    <div class="property-card">
+        {image_html(listing.image_url, "card", alt=listing.title,
+                    style="width:100%; height:200px; object-fit: cover;", **image_options)}
+        <div style="padding: 1rem;">
+            <h3>{escape(listing.title)}</h3>
+            <p>📍 {escape(listing.location)}, Himachal Pradesh</p>
+            <p>{escape(listing.price_text)}</p>
+            <p>{escape(listing.summary)}</p>
+        </div>
+    </div>
+    """).strip()
+
+
+def featured_grid_html(listings, **image_options):
+    """All featured cards in one two-column grid"""
+    cards = "\n".join(property_card_html(listing, **image_options) for listing in listings)
+    return f'<div class="featured-grid">\n{cards}\n</div>'
+
+
+def about_image_html(**image_options):
+    return image_html(ABOUT_IMAGE_URL, "column", alt="Himachal Pradesh",
+                      style="width:100%; height:auto;", **image_options)
+
+
+# Contact tab social links: (label, URL, icon name in icons/)
+SOCIAL_LINKS = (
+    ("Facebook", "https://facebook.com", "facebook"),
+    ("Instagram", "https://instagram.com", "instagram"),
+    ("Twitter", "https://twitter.com", "twitter"),
+    ("LinkedIn", "https://linkedin.com", "linkedin"),
+)
+
+
+def social_links_html():
+    links = "".join(f'<a class="icon-{icon}" href="{url}" title="{label}" aria-label="{label}"></a>'
+                    for label, url, icon in SOCIAL_LINKS)
+    return f'<div class="social-links">{links}</div>'
+
+
+def contact_details_markdown(contact):
+    """Office address, contact information and hours for the Contact tab"""
+    return f"""
+    ### Office Address
+    📍 {contact['OFFICE_ADDRESS']}
+
+    ### Contact Information
+    📞 {contact['CONTACT_PHONE']}
+    📧 {contact['CONTACT_EMAIL']}
+    🌐 {contact['WEBSITE_URL']}
+
+    ### Office Hours
+    🕘 Monday - Saturday: 9:00 AM - 6:00 PM  
+    🚪 Sunday: Closed
+    """
+
+
+def footer_html(contact):
+    return f"""
+    <div class="footer">
+        <p>© 2025 Himachal Land Deals. All Rights Reserved.</p>
+        <p>📍 {escape(contact['OFFICE_ADDRESS'])}</p>
+        <p>📞 {escape(contact['CONTACT_PHONE'])} | ✉️ {escape(contact['CONTACT_EMAIL'])} | 🌐 {escape(contact['WEBSITE_URL'])}</p>
+        <p>Designed with ❤️ by Himachal Land Deals</p>
+    </div>
+    """
@@ -0,0 +1,205 @@
+"""In-process timers, counters and latency histograms with JSON/Prometheus export"""
+import bisect
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = Path(__file__).parent / "data"
+
+# Histogram bucket upper bounds in seconds: 10µs to ~100s, 4 buckets per doubling
+BUCKETS = tuple(1e-5 * 2 ** (i / 4) for i in range(94))
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_collectors = {}
+_flusher = None
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class Histogram:
+    """Fixed log-spaced buckets; quantiles are accurate to about 19%"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+        return BUCKETS[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def refresh():
+    """Pick up METRICS_ENABLED from the config; call once per script run"""
+    global _enabled
+    config = get_snapshot()
+    _enabled = config.get_bool('METRICS_ENABLED', False)
+    if _enabled and _flusher is None:
+        _start_flusher(config)
+
+
+def enabled():
+    return _enabled
+
+
+def incr(name, amount=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name, seconds):
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def timer(name):
+    """Context manager recording the block's duration; a shared no-op when disabled"""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name):
+    """Decorator form of timer()"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_collector(name, collect):
+    """Include collect() (a dict of numbers) in every snapshot under name"""
+    _collectors[name] = collect
+
+
+def snapshot():
+    """Counters, histogram summaries and collector values as plain data"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {name: h.summary() for name, h in _histograms.items()}
+    gauges = {}
+    for name, collect in list(_collectors.items()):
+        try:
+            values = collect()
+        except Exception as e:
+            logger.debug("Metrics collector %s failed: %s", name, e)
+            continue
+        for key, value in (values or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f"{name}.{key}"] = value
+    return {"time": time.time(), "counters": counters, "histograms": histograms, "gauges": gauges}
+
+
+def _prom_name(name):
+    return "hld_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def prometheus_text(data=None):
+    """Snapshot in the Prometheus text exposition format"""
+    data = data or snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines += [f"# TYPE {_prom_name(name)}_total counter", f"{_prom_name(name)}_total {value}"]
+    for name, value in sorted(data["gauges"].items()):
+        lines += [f"# TYPE {_prom_name(name)} gauge", f"{_prom_name(name)} {value}"]
+    for name, summary in sorted(data["histograms"].items()):
+        metric = _prom_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for q, label in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+            if summary[q] is not None:
+                lines.append(f'{metric}{{quantile="{label}"}} {summary[q]:.6g}')
+        lines += [f"{metric}_sum {summary['sum']:.6g}", f"{metric}_count {summary['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def flush(directory=None):
+    """Write metrics.json and metrics.prom to METRICS_DIR (default data/)"""
+    directory = Path(directory or get_snapshot().get_str('METRICS_DIR') or DEFAULT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    data = snapshot()
+    _write_atomic(directory / "metrics.json", json.dumps(data, indent=2))
+    _write_atomic(directory / "metrics.prom", prometheus_text(data))
+
+
+def _start_flusher(config):
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        interval = config.get_float('METRICS_FLUSH_INTERVAL', 60.0)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if not _enabled:
+                    continue
+                try:
+                    flush()
+                except OSError as e:
+                    logger.warning("Could not write metrics: %s", e)
+
+        _flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        _flusher.start()
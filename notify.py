@@ -0,0 +1,254 @@
+"""Enquiry notification emails, sent one by one or coalesced into digests"""
+import atexit
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.message import EmailMessage
+from html import escape
+from string import Template
+
+import metrics
+from config import get_snapshot
+from outbox import get_outbox
+
+logger = logging.getLogger(__name__)
+
+MODES = ("immediate", "digest")
+DEFAULT_HOT_KEYWORDS = "urgent,asap,site visit,today,ready to buy,cash"
+DEFAULT_HOT_SUBJECTS = "Appointment Request"
+
+# Templates are parsed once. Values in the HTML bodies are escaped; subjects
+# are plain text on one line
+ENQUIRY_SUBJECT = Template("New Property Enquiry - $property")
+ENQUIRY_HTML = Template("""
+<h2>New Property Enquiry</h2>
+<p><strong>Property:</strong> $property</p>
+<p><strong>Name:</strong> $name</p>
+<p><strong>Email:</strong> $email</p>
+<p><strong>Phone:</strong> $phone</p>
+<p><strong>Lead score:</strong> $lead</p>
+<p><strong>Message:</strong></p>
+<p>$message</p>
+""")
+
+DIGEST_SUBJECT = Template("$count New Property Enquiries ($properties properties)")
+DIGEST_HTML = Template("""
+<h2>$count New Property Enquiries</h2>
+<p>Received between $first and $last.</p>
+$groups
+""")
+DIGEST_GROUP_HTML = Template("""
+<h3>$property ($count)</h3>
+<table cellpadding="6" style="border-collapse: collapse;">
+<tr><th align="left">Time</th><th align="left">Name</th><th align="left">Email</th><th align="left">Phone</th><th align="left">Lead</th><th align="left">Message</th></tr>
+$rows
+</table>
+""")
+DIGEST_ROW_HTML = Template(
+    "<tr><td>$time</td><td>$name</td><td>$email</td><td>$phone</td><td>$lead</td><td>$message</td></tr>"
+)
+
+
+def _render(template, html=None, **values):
+    # html: already rendered (trusted) fragments that must not be escaped again
+    fields = {key: escape(str(value)) for key, value in values.items()}
+    fields.update(html or {})
+    return template.substitute(fields)
+
+
+def _subject(template, **values):
+    # A header is plain text: no HTML escaping, and CR/LF or runs of whitespace become one space
+    return re.sub(r"\s+", " ", template.safe_substitute({key: str(value) for key, value in values.items()})).strip()
+
+
+def _fields(enquiry, lead=None):
+    return {
+        'property': enquiry.property_name or "General Enquiry",
+        'name': enquiry.name,
+        'email': enquiry.email,
+        'phone': enquiry.phone,
+        'message': enquiry.message,
+        'lead': lead.summary() if lead is not None else "not checked",
+    }
+
+
+def _clock(timestamp):
+    return time.strftime("%H:%M:%S", time.localtime(timestamp))
+
+
+def build_message(sender, recipient, subject, body):
+    """RFC 5322 text of an HTML email"""
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.set_content(body, subtype="html")
+    return message.as_string()
+
+
+def render_enquiry(enquiry, lead=None):
+    """(subject, html) of the email for a single enquiry"""
+    fields = _fields(enquiry, lead)
+    return _subject(ENQUIRY_SUBJECT, property=fields['property']), _render(ENQUIRY_HTML, **fields)
+
+
+def render_digest(enquiries, leads=None):
+    """(subject, html) of one email covering enquiries, grouped by property.
+
+    leads, if given, holds the LeadCheck (or None) for each enquiry in order.
+    """
+    leads = leads or [None] * len(enquiries)
+    groups = OrderedDict()
+    for enquiry, lead in sorted(zip(enquiries, leads), key=lambda pair: pair[0].created_at):
+        groups.setdefault(enquiry.property_name or "General Enquiry", []).append((enquiry, lead))
+    sections = []
+    for property_name, items in groups.items():
+        rows = "\n".join(
+            _render(DIGEST_ROW_HTML, time=_clock(e.created_at), **_fields(e, lead))
+            for e, lead in items
+        )
+        sections.append(_render(DIGEST_GROUP_HTML, html={'rows': rows}, property=property_name, count=len(items)))
+    times = [e.created_at for e in enquiries]
+    subject = _subject(DIGEST_SUBJECT, count=len(enquiries), properties=len(groups))
+    body = _render(DIGEST_HTML, html={'groups': "\n".join(sections)}, count=len(enquiries),
+                   first=_clock(min(times)), last=_clock(max(times)))
+    return subject, body
+
+
+def hot_lead_rule(keywords=DEFAULT_HOT_KEYWORDS, subjects=DEFAULT_HOT_SUBJECTS):
+    """Predicate for enquiries that skip the digest: a listed subject or keyword"""
+    words = [word.strip() for word in keywords.split(",") if word.strip()]
+    pattern = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, words)), re.IGNORECASE) if words else None
+    hot_subjects = {subject.strip().lower() for subject in subjects.split(",") if subject.strip()}
+
+    def is_hot(enquiry):
+        if enquiry.subject.strip().lower() in hot_subjects:
+            return True
+        return bool(pattern and pattern.search(f"{enquiry.subject} {enquiry.message}"))
+
+    return is_hot
+
+
+class Notifier:
+    """Turns logged enquiries into outbox emails.
+
+    In "immediate" mode every enquiry gets its own email. In "digest" mode
+    enquiries are held until `window` seconds after the first one, or until
+    `max_batch` are waiting, and then go out as one email grouped by
+    property. Enquiries matching the hot-lead rule are always sent at once.
+    """
+
+    def __init__(self, sender, recipient, mode="immediate", window=60.0, max_batch=20, hot_lead=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown notification mode {mode!r}; expected one of {MODES}")
+        self.sender = sender
+        self.recipient = recipient
+        self.mode = mode
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.hot_lead = hot_lead or (lambda enquiry: False)
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def submit(self, enquiry, on_result=None, lead=None):
+        """Queue the notification for an enquiry; on_result(ok, detail) reports delivery"""
+        if self.mode == "immediate" or self.hot_lead(enquiry):
+            metrics.incr("notify.immediate")
+            return self._send_one(enquiry, on_result, lead)
+        with self._lock:
+            self._pending.append((enquiry, on_result, lead))
+            batch = self._take() if len(self._pending) >= self.max_batch else None
+            if batch is None and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._send_digest(batch)
+        return True
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Send whatever is waiting for the digest now"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send_digest(batch)
+
+    def _send_one(self, enquiry, on_result, lead=None):
+        subject, body = render_enquiry(enquiry, lead)
+        payload = build_message(self.sender, self.recipient, subject, body)
+        return get_outbox().enqueue(self.sender, self.recipient, payload, on_result=on_result)
+
+    def _send_digest(self, batch):
+        if len(batch) == 1:
+            enquiry, on_result, lead = batch[0]
+            if not self._send_one(enquiry, on_result, lead) and on_result:
+                on_result(False, "not queued")
+            return
+        metrics.incr("notify.digests")
+        metrics.incr("notify.digest_enquiries", len(batch))
+        subject, body = render_digest([enquiry for enquiry, _, _ in batch], [lead for _, _, lead in batch])
+        callbacks = [on_result for _, on_result, _ in batch if on_result]
+
+        def on_digest_result(ok, detail):
+            for callback in callbacks:
+                callback(ok, detail)
+
+        payload = build_message(self.sender, self.recipient, subject, body)
+        if not get_outbox().enqueue(self.sender, self.recipient, payload, on_result=on_digest_result):
+            logger.error("Outbox closed; %d digest enquiries not sent", len(batch))
+            on_digest_result(False, "not queued")
+
+
+_notifier = None
+_notifier_version = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    """Process-wide notifier configured from NOTIFY_* settings, rebuilt when they change"""
+    global _notifier, _notifier_version
+    config = get_snapshot()
+    if _notifier is not None and _notifier_version == config.version:
+        return _notifier
+    with _notifier_lock:
+        if _notifier is None or _notifier_version != config.version:
+            previous = _notifier
+            mode = (config.get_str('NOTIFY_MODE') or "immediate").lower()
+            if mode not in MODES:
+                logger.warning("Unknown NOTIFY_MODE %r, sending immediately", mode)
+                mode = "immediate"
+            _notifier = Notifier(
+                config.get('EMAIL_HOST_USER'),
+                config.get('RECIPIENT_EMAIL'),
+                mode=mode,
+                window=config.get_float('NOTIFY_DIGEST_WINDOW', 60.0),
+                max_batch=config.get_int('NOTIFY_DIGEST_MAX', 20),
+                hot_lead=hot_lead_rule(config.get_str('NOTIFY_HOT_KEYWORDS', DEFAULT_HOT_KEYWORDS),
+                                       config.get_str('NOTIFY_HOT_SUBJECTS', DEFAULT_HOT_SUBJECTS)),
+            )
+            _notifier_version = config.version
+            if previous is not None:
+                previous.flush()
+    return _notifier
+
+
+# Registered after the outbox's own hook, so it runs first and the digest
+# still reaches a live outbox on shutdown
+@atexit.register
+def _shutdown():
+    if _notifier is not None:
+        _notifier.flush()
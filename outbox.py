@@ -0,0 +1,297 @@
+"""Background outbox that delivers enquiry emails over long-lived SMTP connections"""
+import atexit
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import metrics
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Number of recent send latencies kept for the metrics summary
+LATENCY_WINDOW = 200
+
+# Errors that will not go away by retrying the same message
+_PERMANENT_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused,
+                     smtplib.SMTPSenderRefused)
+
+
+@dataclass
+class OutgoingEmail:
+    """A fully built message waiting in the outbox"""
+    sender: str
+    recipients: List[str]
+    payload: str
+    on_result: Optional[Callable[[bool, str], None]] = None
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def report(self, ok, detail=""):
+        if self.on_result is None:
+            return
+        try:
+            self.on_result(ok, detail)
+        except Exception:
+            logger.exception("Outbox result callback failed")
+
+
+@dataclass(frozen=True)
+class SMTPSettings:
+    host: str = "smtp.gmail.com"
+    port: int = 587
+    username: str = ""
+    password: str = ""
+    starttls: bool = True
+    timeout: float = 30.0
+
+    @classmethod
+    def from_config(cls, config=None):
+        """Build settings from the config snapshot (SMTP_* and EMAIL_HOST_* keys)"""
+        config = config or get_snapshot()
+        return cls(
+            host=config.get_str('SMTP_HOST', cls.host),
+            port=config.get_int('SMTP_PORT', cls.port),
+            username=config.get_str('EMAIL_HOST_USER'),
+            password=config.get_str('EMAIL_HOST_PASSWORD'),
+            starttls=config.get_bool('SMTP_STARTTLS', cls.starttls),
+            timeout=config.get_float('SMTP_TIMEOUT', cls.timeout),
+        )
+
+
+class SMTPConnection:
+    """One authenticated SMTP session that reconnects when it goes stale"""
+
+    def __init__(self, settings, keepalive=60.0):
+        self.settings = settings
+        self.keepalive = keepalive
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        settings = self.settings
+        server = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+        try:
+            server.ehlo()
+            if settings.starttls:
+                server.starttls()
+                server.ehlo()
+            if settings.password:
+                server.login(settings.username, settings.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._last_used = time.monotonic()
+
+    @property
+    def connected(self):
+        return self._server is not None
+
+    def ensure(self):
+        """Connect if needed, probing idle connections with NOOP first"""
+        if self._server is not None and time.monotonic() - self._last_used > self.keepalive:
+            if not self.noop():
+                self.close()
+        if self._server is None:
+            self._connect()
+        return self._server
+
+    def noop(self):
+        """Send NOOP to keep the session alive; returns False if it is dead"""
+        if self._server is None:
+            return False
+        try:
+            code, _ = self._server.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        self._last_used = time.monotonic()
+        return code == 250
+
+    def send(self, item):
+        self.ensure().sendmail(item.sender, item.recipients, item.payload)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+
+
+class Outbox:
+    """Queue of outgoing emails drained by a small pool of worker threads.
+
+    Each worker owns one SMTP connection, keeps it alive with NOOP while the
+    queue is idle (unless keepalive is 0) and reconnects on failure. Failed sends are retried up to
+    max_retries times with exponential backoff.
+    """
+
+    def __init__(self, settings, pool_size=2, max_retries=3, backoff=2.0, keepalive=60.0):
+        self.settings = settings
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.keepalive = keepalive
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "connection_errors": 0}
+        self._workers = [
+            threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            for i in range(max(1, pool_size))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, sender, recipients, payload, on_result=None):
+        """Queue a message for delivery and return immediately.
+
+        on_result(ok, detail) is called from a worker thread once the message
+        has been sent or given up on.
+        """
+        if self._stopping.is_set():
+            return False
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        self._queue.put(OutgoingEmail(sender, list(recipients), payload, on_result))
+        self._count("enqueued")
+        return True
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _run(self):
+        connection = SMTPConnection(self.settings, keepalive=self.keepalive)
+        # With no keepalive, block until there is work instead of spinning
+        idle_timeout = self.keepalive / 2 if self.keepalive > 0 else None
+        try:
+            while not self._stopping.is_set() or not self._queue.empty():
+                try:
+                    item = self._queue.get(timeout=idle_timeout)
+                except queue.Empty:
+                    # Idle: keep the session warm, drop it if the server hung up
+                    if connection.connected and not connection.noop():
+                        connection.close()
+                    continue
+                if item is None:
+                    self._queue.task_done()
+                    break
+                self._deliver(connection, item)
+                self._queue.task_done()
+        finally:
+            connection.close()
+
+    def _deliver(self, connection, item):
+        while True:
+            started = time.monotonic()
+            try:
+                connection.send(item)
+            except _PERMANENT_ERRORS as e:
+                logger.error("Enquiry email rejected, not retrying: %s", e)
+                self._count("failed")
+                item.report(False, str(e))
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                connection.close()
+                self._count("connection_errors")
+                item.attempts += 1
+                if item.attempts > self.max_retries or self._stopping.is_set():
+                    logger.error("Giving up on enquiry email after %d attempts: %s", item.attempts, e)
+                    self._count("failed")
+                    item.report(False, str(e))
+                    return
+                self._count("retried")
+                delay = self.backoff * 2 ** (item.attempts - 1)
+                logger.warning("Enquiry email send failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                continue
+            with self._lock:
+                self._counters["sent"] += 1
+                self._latencies.append((time.monotonic() - started, time.monotonic() - item.enqueued_at))
+            item.report(True)
+            return
+
+    def metrics(self):
+        """Queue depth, counters and recent latency figures (seconds)"""
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = list(self._latencies)
+        send = sorted(sample[0] for sample in latencies)
+        total = sorted(sample[1] for sample in latencies)
+
+        def pct(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            **counters,
+            "send_latency_p50": pct(send, 0.5),
+            "send_latency_p95": pct(send, 0.95),
+            "delivery_latency_p50": pct(total, 0.5),
+            "delivery_latency_p95": pct(total, 0.95),
+        }
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been handled"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=10.0):
+        """Stop accepting mail, drain the queue and close the connections"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+
+
+_outbox = None
+_outbox_version = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Process-wide outbox, rebuilt when the configuration changes"""
+    global _outbox, _outbox_version
+    config = get_snapshot()
+    if _outbox is not None and _outbox_version == config.version:
+        return _outbox
+    with _outbox_lock:
+        if _outbox is None or _outbox_version != config.version:
+            previous = _outbox
+            _outbox = Outbox(
+                SMTPSettings.from_config(config),
+                pool_size=config.get_int('SMTP_POOL_SIZE', 2),
+                max_retries=config.get_int('SMTP_MAX_RETRIES', 3),
+                backoff=config.get_float('SMTP_RETRY_BACKOFF', 2.0),
+                keepalive=config.get_float('SMTP_KEEPALIVE', 60.0),
+            )
+            _outbox_version = config.version
+            if previous is not None:
+                threading.Thread(target=previous.stop, daemon=True).start()
+    return _outbox
+
+
+metrics.register_collector("outbox", lambda: _outbox.metrics() if _outbox is not None else {})
+
+
+@atexit.register
+def _shutdown():
+    if _outbox is not None:
+        _outbox.stop(timeout=5.0)
@@ -0,0 +1,166 @@
+"""Normalize free-text listing prices and areas into rupees and square feet"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Bump when parsing results change, so stored listings are re-parsed
+PARSER_VERSION = 3
+
+# Multipliers for Indian number words
+AMOUNT_UNITS = {
+    "thousand": 1e3, "k": 1e3,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "l": 1e5,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+}
+
+# Land units in square feet; bigha/biswa use the Himachal Pradesh measure
+AREA_UNITS = {
+    "sqft": 1.0,
+    "sqyd": 9.0,
+    "sqm": 10.7639,
+    "marla": 272.25,
+    "biswa": 435.6,
+    "kanal": 5445.0,
+    "bigha": 8712.0,
+    "acre": 43560.0,
+    "hectare": 107639.0,
+}
+
+_UNIT_ALIASES = [
+    (re.compile(r"sq\.?\s*(?:ft|feet|foot)\.?|square\s*(?:feet|foot|ft)|sqft|sft"), "sqft"),
+    (re.compile(r"sq\.?\s*(?:yd|yards?)\.?|square\s*yards?|gaj"), "sqyd"),
+    (re.compile(r"sq\.?\s*(?:m|mtrs?|meters?|metres?)\.?|square\s*(?:meters?|metres?)"), "sqm"),
+    (re.compile(r"acres?"), "acre"),
+    (re.compile(r"hectares?|\bha\b"), "hectare"),
+    (re.compile(r"bighas?"), "bigha"),
+    (re.compile(r"biswas?"), "biswa"),
+    (re.compile(r"kanals?"), "kanal"),
+    (re.compile(r"marlas?"), "marla"),
+]
+
+_NUMBER = r"(\d+(?:,\d{2,3})*(?:\.\d+)?)"
+_AMOUNT_RE = re.compile(
+    _NUMBER + r"\s*(thousand|lakhs?|lacs?|crores?|cr|l|k)?\b\.?", re.IGNORECASE
+)
+# "10-20 bigha" or "10 bigha to 20 bigha": a unit may follow the first number too
+_AREA_RANGE_RE = re.compile(
+    _NUMBER + r"(?:\s*[a-z.]*?\s*(?:-|–|\bto\b)\s*" + _NUMBER + r")?", re.IGNORECASE
+)
+_PER_UNIT_RE = re.compile(r"(?:\bper\b|/)\s*(.+)$", re.IGNORECASE)
+# The words right after a number, up to the next number or punctuation: where its unit is
+_UNIT_WORDS_RE = re.compile(r"\s*([^\d,;:()]+)")
+_FROM_RE = re.compile(r"\b(?:starting|starts|from|onwards|upwards|above|min(?:imum)?)\b", re.IGNORECASE)
+_UPTO_RE = re.compile(r"\b(?:up\s*to|upto|below|under|max(?:imum)?)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class PriceRange:
+    """Price in rupees; unit_sqft is the size of the unit in sq.ft. when quoted as a rate"""
+    low: float
+    high: float
+    unit_sqft: Optional[float] = None
+
+    @property
+    def is_rate(self):
+        return self.unit_sqft is not None
+
+
+@dataclass(frozen=True)
+class AreaRange:
+    """Area in square feet"""
+    low: float
+    high: float
+
+
+def _to_float(number):
+    return float(number.replace(",", ""))
+
+
+def parse_unit(text) -> Optional[float]:
+    """Square feet in one unit named in text (e.g. "acre" -> 43560), or None"""
+    text = text.strip().lower()
+    for pattern, unit in _UNIT_ALIASES:
+        if pattern.search(text):
+            return AREA_UNITS[unit]
+    return None
+
+
+def parse_price(text) -> Optional[PriceRange]:
+    """Parse "₹30 Lakhs - ₹50 Lakhs per acre", "Starting from ₹25 Lakhs", etc.
+
+    A missing upper bound ("starting from") is returned as infinity and a
+    missing lower bound ("up to") as zero.
+    """
+    if not text:
+        return None
+    unit_sqft = None
+    amount_text = text
+    per = _PER_UNIT_RE.search(text)
+    if per:
+        unit_sqft = parse_unit(per.group(1))
+        amount_text = text[:per.start()]
+
+    matches = _AMOUNT_RE.findall(amount_text)
+    if not matches:
+        return None
+    # "₹30-50 Lakhs": a bare first number shares the multiplier of the second
+    if len(matches) >= 2 and not matches[0][1]:
+        matches[0] = (matches[0][0], matches[1][1])
+    amounts = [_to_float(number) * AMOUNT_UNITS.get(word.lower(), 1.0) for number, word in matches]
+
+    low, high = min(amounts[:2]), max(amounts[:2])
+    if len(amounts) == 1:
+        if _FROM_RE.search(amount_text):
+            high = math.inf
+        elif _UPTO_RE.search(amount_text):
+            low = 0.0
+    return PriceRange(low, high, unit_sqft)
+
+
+def parse_area(text) -> Optional[AreaRange]:
+    """Parse "5-10 Acres available", "2400-5000 sq.ft. plots", etc. into sq.ft."""
+    if not text:
+        return None
+    matches = list(_AREA_RANGE_RE.finditer(text))
+    if not matches:
+        return None
+    # The first number (or range) that carries a unit; "Plot 12: 5 acres" is 5 acres
+    for match in matches:
+        words = _UNIT_WORDS_RE.match(text, match.end())
+        unit_sqft = parse_unit(match.group(0)) or (parse_unit(words.group(1)) if words else None)
+        if unit_sqft:
+            break
+    else:
+        match, unit_sqft = matches[0], parse_unit(text) or 1.0
+    low = _to_float(match.group(1)) * unit_sqft
+    high = _to_float(match.group(2)) * unit_sqft if match.group(2) else low
+    return AreaRange(min(low, high), max(low, high))
+
+
+def normalize_listing(price_text, area_text):
+    """Numeric columns for a listing: total price and per-sq.ft. rate ranges plus area.
+
+    Returns a dict with price_min/price_max (rupees), rate_min/rate_max
+    (rupees per sq.ft.) and area_min/area_max (sq.ft.); unknown values are None.
+    """
+    price = parse_price(price_text)
+    area = parse_area(area_text)
+    result = dict.fromkeys(("price_min", "price_max", "rate_min", "rate_max", "area_min", "area_max"))
+    if area:
+        result["area_min"], result["area_max"] = area.low, area.high
+    if price is None:
+        return result
+
+    if price.is_rate:
+        result["rate_min"] = price.low / price.unit_sqft
+        result["rate_max"] = price.high / price.unit_sqft
+        if area:
+            result["price_min"] = price.low * area.low / price.unit_sqft
+            result["price_max"] = price.high * area.high / price.unit_sqft
+    else:
+        result["price_min"], result["price_max"] = price.low, price.high
+        if area and math.isfinite(price.high):
+            result["rate_min"] = price.low / area.high
+            result["rate_max"] = price.high / area.low
+    return result
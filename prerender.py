@@ -0,0 +1,310 @@
+"""Static HTML build of the Home, Properties and About pages.
+
+python prerender.py [--out site/] [--force]
+
+Pages are rendered from the same catalog, markup and CSS as the Streamlit
+app. Stylesheet and image files get content-hashed names, and links to the
+Contact form and enquiries point back at the live app (APP_URL, default "/").
+A manifest records the inputs of every page, so a rebuild only rewrites the
+pages whose listings (or shared inputs) changed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from dataclasses import asdict
+from html import escape
+from pathlib import Path
+from urllib.parse import urlencode
+
+from catalog import get_catalog
+from config import get_snapshot
+from bundle import get_bundle, minify_css
+from images import get_derivatives, image_html
+from markup import (ABOUT_IMAGE_URL, ABOUT_STORY, HOME_HEADER, HOME_WELCOME, about_image_html,
+                    contact_info, featured_grid_html, footer_html)
+
+DEFAULT_OUT = Path(__file__).parent / "site"
+ASSET_DIR = "assets"
+IMAGE_DIR = f"{ASSET_DIR}/img"
+MANIFEST = "manifest.json"
+
+# Bump when the page layout below changes, so every page is rebuilt
+TEMPLATE_VERSION = 2
+
+# Page chrome that Streamlit provides in the live app
+SITE_CSS = """
+body { margin: 0; font-family: "Source Sans Pro", system-ui, sans-serif; color: #31333f; }
+.site-nav { display: flex; justify-content: center; background: #f8f9fa; }
+.site-nav a { padding: 0.75rem 1.5rem; color: #31333f; text-decoration: none; font-size: 16px; }
+.site-nav a:hover { background: #eee; }
+.site-nav a.selected { background: #1e3c72; color: white; }
+.main { padding-top: 1.5rem; }
+.columns { display: grid; grid-template-columns: 1fr 2fr; gap: 1.5rem; align-items: start; }
+.listing-row { display: grid; grid-template-columns: 1fr 4fr; gap: 1rem; padding: 1rem;
+               border: 1px solid #e6e6e6; border-radius: 8px; margin-bottom: 1rem; }
+.button { display: inline-block; padding: 0.4rem 0.9rem; margin-right: 0.5rem; border-radius: 5px;
+          border: 1px solid #ccc; color: #31333f; text-decoration: none; }
+.button.primary { background: #1e3c72; border-color: #1e3c72; color: white; }
+@media (max-width: 768px) { .columns, .listing-row { grid-template-columns: 1fr; } }
+"""
+
+NAV = (("Home", "index.html"), ("Properties", "properties.html"), ("About", "about.html"))
+
+PAGE_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title} | Himachal Land Deals</title>
+<link rel="stylesheet" href="{css}">
+</head>
+<body>
+<nav class="site-nav">{nav}</nav>
+<div class="main">
+{body}
+{footer}
+</div>
+</body>
+</html>
+"""
+
+
+def _inline(text):
+    return re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", escape(text))
+
+
+def markdown_html(text):
+    """The small markdown subset used by the page copy: headings, lists, paragraphs"""
+    blocks, paragraph, items = [], [], []
+
+    def close():
+        if paragraph:
+            blocks.append("<p>" + "\n".join(paragraph) + "</p>")
+            paragraph.clear()
+        if items:
+            blocks.append("<ul>" + "".join(f"<li>{item}</li>" for item in items) + "</ul>")
+            items.clear()
+
+    for line in text.strip().splitlines():
+        stripped = line.strip()
+        heading = re.match(r"(#{1,6}) (.*)", stripped)
+        if not stripped:
+            close()
+        elif heading:
+            close()
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif stripped.startswith("- "):
+            if paragraph:
+                close()
+            items.append(_inline(stripped[2:]))
+        else:
+            if items:
+                close()
+            paragraph.append(_inline(stripped))
+    close()
+    return "\n".join(blocks)
+
+
+def _digest(data):
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()[:12]
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def app_link(app_url, **params):
+    """Link into the live Streamlit app"""
+    return f"{app_url}?{urlencode(params)}"
+
+
+def listing_page(listing):
+    return f"listing-{listing.slug}.html"
+
+
+class SiteBuilder:
+    """Renders pages into out/ and copies the image files they reference"""
+
+    def __init__(self, out, catalog, contact, app_url):
+        self.out = Path(out)
+        self.catalog = catalog
+        self.contact = contact
+        self.app_url = app_url
+        css = get_bundle().css + minify_css(SITE_CSS)
+        self.css_name = f"{ASSET_DIR}/site.{_digest(css)}.css"
+        self.css = css
+
+    def pages(self):
+        """{file name: (inputs, render)} for every page of the site"""
+        listings = self.catalog.listings
+        pages = {
+            "index.html": ([asdict(listing) for listing in self.catalog.featured], self.home),
+            "properties.html": ([asdict(listing) for listing in listings], self.properties),
+            "about.html": ([ABOUT_IMAGE_URL, ABOUT_STORY], self.about),
+        }
+        for listing in listings:
+            pages[listing_page(listing)] = (asdict(listing), lambda listing=listing: self.listing(listing))
+        return pages
+
+    def page_key(self, inputs):
+        shared = [TEMPLATE_VERSION, self.css_name, self.contact, self.app_url]
+        return _digest(json.dumps([shared, inputs], sort_keys=True, default=str))
+
+    def images(self, *requests):
+        """Build derivatives for (url, preset) pairs and copy them into the site.
+
+        Returns the copied file names and whether every image had derivatives;
+        a page with missing ones falls back to the original URLs for now.
+        """
+        names, complete = [], True
+        for url, preset in requests:
+            derivatives = get_derivatives(url, preset, wait=True)
+            if not derivatives:
+                complete = False
+                continue
+            for items in derivatives.values():
+                for item in items:
+                    target = self.out / IMAGE_DIR / item.path.name
+                    if not target.exists():
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        shutil.copyfile(item.path, target)
+                    names.append(item.path.name)
+        return names, complete
+
+    def page(self, title, body):
+        links = [(name, href, ' class="selected"' if name == title else "") for name, href in NAV]
+        # Tabs that only exist in the live app
+        links.insert(2, ("Market Insights", escape(app_link(self.app_url, tab="Market Insights")), ""))
+        links.append(("Contact", escape(app_link(self.app_url, tab="Contact")), ""))
+        nav = "".join(f'<a href="{href}"{selected}>{name}</a>' for name, href, selected in links)
+        return PAGE_HTML.format(title=escape(title), css=self.css_name, nav=nav, body=body,
+                                footer=footer_html(self.contact))
+
+    def enquire_button(self, listing):
+        href = app_link(self.app_url, enquire="true", property=listing.display_name)
+        return f'<a class="button primary" href="{escape(href)}">Enquire Now</a>'
+
+    def home(self):
+        featured = self.catalog.featured
+        images = self.images(*((listing.image_url, "card") for listing in featured))
+        body = "\n".join([
+            HOME_HEADER,
+            markdown_html(HOME_WELCOME),
+            "<h2>✨ Featured Properties</h2>",
+            featured_grid_html(featured, wait=True, base_url=IMAGE_DIR),
+        ])
+        return self.page("Home", body), images
+
+    def properties(self):
+        listings = self.catalog.listings
+        images = self.images(*((listing.image_url, "thumb") for listing in listings))
+        rows = []
+        for listing in listings:
+            facts = [f"📍 {listing.location}"]
+            if listing.price_text:
+                facts.append(f"💰 {listing.price_text}")
+            if listing.area_text:
+                facts.append(f"📏 {listing.area_text}")
+            image = image_html(listing.image_url, "thumb", alt=listing.title,
+                               style="width:100%; height:auto; border-radius: 6px;",
+                               wait=True, base_url=IMAGE_DIR)
+            rows.append(
+                f'<div class="listing-row"><div>{image}</div><div>'
+                f'<p><strong>{escape(listing.icon)} {escape(listing.title)}</strong><br>'
+                f'{escape(" · ".join(facts))}</p>'
+                f'<a class="button" href="{listing_page(listing)}">View details</a>'
+                f'{self.enquire_button(listing)}</div></div>'
+            )
+        body = f"<h1>🏞️ Available Properties</h1>\n<p>{len(listings)} properties</p>\n" + "\n".join(rows)
+        return self.page("Properties", body), images
+
+    def listing(self, listing):
+        images = self.images((listing.image_url, "column"))
+        details = [f"📍 Location: {listing.location}, Himachal Pradesh"]
+        if listing.area_text:
+            details.append(f"📏 Area: {listing.area_text}")
+        if listing.price_text:
+            details.append(f"💰 Price: {listing.price_text}")
+        items = "".join(f"<li>{escape(detail)}</li>" for detail in details)
+        if listing.features:
+            features = "".join(f"<li>{escape(feature)}</li>" for feature in listing.features)
+            items += f"<li>🌟 Features: <ul>{features}</ul></li>"
+        image = image_html(listing.image_url, "column", alt=listing.title,
+                           style="width:100%; height:auto;", wait=True, base_url=IMAGE_DIR)
+        body = (
+            f'<p><a class="button" href="properties.html">← Back to all properties</a></p>\n'
+            f'<h1>{escape(listing.icon)} {escape(listing.display_name)}</h1>\n'
+            f'<div class="columns"><div>{image}</div><div>'
+            f'<h2>{escape(listing.title)}</h2><ul>{items}</ul>{self.enquire_button(listing)}</div></div>'
+        )
+        return self.page("Properties", body), images
+
+    def about(self):
+        images = self.images((ABOUT_IMAGE_URL, "column"))
+        body = (
+            "<h1>🏔️ About Us</h1>\n"
+            f'<div class="columns"><div>{about_image_html(wait=True, base_url=IMAGE_DIR)}</div>'
+            f"<div>{markdown_html(ABOUT_STORY)}</div></div>"
+        )
+        return self.page("About", body), images
+
+    def build(self, force=False):
+        """Render changed pages and prune stale files; returns the names rebuilt"""
+        manifest_path = self.out / MANIFEST
+        try:
+            previous = {} if force else json.loads(manifest_path.read_text(encoding="utf-8"))["pages"]
+        except (OSError, ValueError, KeyError):
+            previous = {}
+        css_path = self.out / self.css_name
+        if not css_path.exists():
+            _write(css_path, self.css)
+
+        entries, rebuilt = {}, []
+        for name, (inputs, render) in self.pages().items():
+            key = self.page_key(inputs)
+            entry = previous.get(name)
+            # Pages built while an image was unavailable are retried on every build
+            if entry and entry["key"] == key and entry["complete"] and (self.out / name).exists():
+                entries[name] = entry
+                continue
+            html, (images, complete) = render()
+            _write(self.out / name, html)
+            entries[name] = {"key": key, "complete": complete, "images": sorted(set(images))}
+            rebuilt.append(name)
+
+        self._prune(previous, entries)
+        _write(manifest_path, json.dumps({"css": self.css_name, "pages": entries}, indent=2))
+        return rebuilt
+
+    def _prune(self, previous, entries):
+        # Only files this build owns: pages from the last manifest and assets/
+        for name in set(previous) - set(entries):
+            (self.out / name).unlink(missing_ok=True)
+        keep = {self.css_name} | {f"{IMAGE_DIR}/{image}" for entry in entries.values() for image in entry["images"]}
+        for path in (self.out / ASSET_DIR).rglob("*"):
+            if path.is_file() and path.relative_to(self.out).as_posix() not in keep:
+                path.unlink()
+
+
+def build_site(out=DEFAULT_OUT, force=False):
+    """Build or update the static site in out; returns the pages rewritten"""
+    config = get_snapshot()
+    builder = SiteBuilder(out, get_catalog(), contact_info(config), config.get_str('APP_URL', "/"))
+    return builder.build(force=force)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="output directory (default site/)")
+    parser.add_argument("--force", action="store_true", help="rebuild every page")
+    args = parser.parse_args()
+    rebuilt = build_site(args.out, args.force)
+    print(f"Rebuilt {len(rebuilt)} pages" + (f": {', '.join(rebuilt)}" if rebuilt else ""), file=sys.stderr)
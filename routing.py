@@ -0,0 +1,172 @@
+"""Parse the URL and session into a route once per run, and count runs per user action"""
+import hmac
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+import streamlit as st
+
+import metrics
+from config import get_snapshot
+
+TABS = ("Home", "Properties", "Market Insights", "About", "Contact")
+PAGE_SIZES = (10, 25, 50)
+
+# Completed actions kept for rerun statistics
+HISTORY_SIZE = 50
+
+
+@dataclass(frozen=True)
+class Route:
+    tab: str = "Home"
+    property_name: Optional[str] = None
+    # Properties tab: open listing (slug), page number, page size and sort key
+    listing: Optional[str] = None
+    page: int = 1
+    page_size: int = PAGE_SIZES[0]
+    sort: Optional[str] = None
+    # Hidden diagnostics page, opened with ?diag=<DIAGNOSTICS_TOKEN>
+    diagnostics: bool = False
+
+    @property
+    def tab_index(self):
+        return TABS.index(self.tab)
+
+
+def _set_query_params(params):
+    # Replace the whole query string (st.query_params.from_dict needs Streamlit 1.33+)
+    st.query_params.clear()
+    for key, value in params.items():
+        st.query_params[key] = value
+
+
+def _init_state():
+    state = st.session_state
+    defaults = {
+        'selected_tab': "Home",
+        'form_submitted': False,
+        'enquiry_property': None,
+    }
+    for key, value in defaults.items():
+        if key not in state:
+            state[key] = value
+
+
+def prefill_enquiry(property_name):
+    """Reset the contact form for a new enquiry about property_name"""
+    st.session_state.enquiry_property = property_name
+    st.session_state.form_submitted = False
+    st.session_state.contact_message = f"I'm interested in {property_name}. " if property_name else ""
+
+
+def parse_route() -> Route:
+    """Work out which page to render from the query string and session state.
+
+    Deep links of the form ?enquire=true&property=... are consumed here: the
+    form is pre-filled and the URL is rewritten to ?tab=Contact&property=...
+    so a later rerun doesn't reset the form again.
+    """
+    _init_state()
+    state = st.session_state
+    params = st.query_params.to_dict()
+
+    if params.get('enquire') == 'true':
+        prefill_enquiry(params.get('property'))
+        params.pop('enquire')
+        params['tab'] = "Contact"
+        _set_query_params(params)
+
+    page_size = _int_param(params, 'per_page', PAGE_SIZES[0])
+    tab = params.get('tab')
+    if tab in TABS:
+        state.selected_tab = tab
+    elif state.selected_tab not in TABS:
+        state.selected_tab = "Home"
+    return Route(
+        tab=state.selected_tab,
+        property_name=state.enquiry_property,
+        listing=params.get('listing') or None,
+        page=max(1, _int_param(params, 'page', 1)),
+        page_size=page_size if page_size in PAGE_SIZES else PAGE_SIZES[0],
+        sort=params.get('sort') or None,
+        diagnostics=_diagnostics_allowed(params.get('diag')),
+    )
+
+
+def _diagnostics_allowed(token):
+    expected = get_snapshot().get_str('DIAGNOSTICS_TOKEN')
+    if not (token and expected):
+        return False
+    try:
+        # Compare bytes: compare_digest rejects str values with non-ASCII characters
+        return hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8"))
+    except (TypeError, AttributeError, UnicodeError):
+        return False
+
+
+def _int_param(params, key, default):
+    try:
+        return int(params.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def navigate(tab, from_menu=False, **params):
+    """Point the session and URL at another page; call from widget callbacks"""
+    st.session_state.selected_tab = tab
+    if from_menu:
+        st.session_state._menu_tab = tab
+    _set_query_params({'tab': tab, **{k: v for k, v in params.items() if v is not None}})
+
+
+def menu_key():
+    """Key for the tab menu, changed whenever the route moved without a menu click.
+
+    option_menu only reads default_index when it mounts, so after an Enquire
+    button, a deep link or back/forward it would still highlight the old tab
+    (and ignore a click on it). A new key remounts it on the right tab.
+    """
+    state = st.session_state
+    if state.get('_menu_tab') != state.selected_tab:
+        state._menu_generation = state.get('_menu_generation', 0) + 1
+        state._menu_tab = state.selected_tab
+    return f"nav_menu_{state._menu_generation}"
+
+
+def update_query(**changes):
+    """Merge changes into the current query string; a value of None removes the key"""
+    params = st.query_params.to_dict()
+    for key, value in changes.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = str(value)
+    _set_query_params(params)
+
+
+def begin_action(name):
+    """Start counting script runs for a new user action (call from callbacks)"""
+    stats = _run_stats()
+    if stats['action'] is not None:
+        stats['history'].append((stats['action'], stats['runs']))
+    stats['action'] = name
+    stats['runs'] = 0
+    metrics.incr(f"actions.{name}")
+
+
+def count_run():
+    """Record one script run against the current user action"""
+    _run_stats()['runs'] += 1
+    metrics.incr("reruns")
+
+
+def _run_stats():
+    if '_run_stats' not in st.session_state:
+        st.session_state._run_stats = {'action': 'load', 'runs': 0, 'history': deque(maxlen=HISTORY_SIZE)}
+    return st.session_state._run_stats
+
+
+def rerun_stats():
+    """Runs used by the current action and the recent history of (action, runs)"""
+    stats = _run_stats()
+    return {'action': stats['action'], 'runs': stats['runs'], 'history': list(stats['history'])}
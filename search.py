@@ -0,0 +1,364 @@
+"""Full-text listing search: an on-disk inverted index ranked with BM25"""
+import hashlib
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import numpy as np
+import streamlit as st
+
+import metrics
+from config import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = Path(__file__).parent / "data" / "search.db"
+
+# Bump when tokenization changes; the store is then rebuilt from scratch
+ANALYZER_VERSION = 2
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Title words count this many times. A query term with no exact match falls
+# back to the words it is a prefix of, then to sound-alikes, at these weights
+TITLE_BOOST = 2
+PREFIX_WEIGHT = 0.75
+PHONETIC_WEIGHT = 0.5
+PHONETIC_PREFIX = "~"
+# Shortest query term expanded by prefix, and the most words it expands to
+MIN_PREFIX = 3
+MAX_EXPANSIONS = 16
+
+# Decoded postings and recent query results kept in memory per index
+POSTINGS_CACHE_SIZE = 4096
+QUERY_CACHE_SIZE = 256
+
+STOPWORDS = frozenset("a an and are at by for from in is of on or per the to with".split())
+
+# Spelling variants of Hindi words in Latin script: aspirates and sibilants
+# fold together (Dharamshala/Dharamsala, Shimla/Simla) and doubled letters
+# collapse (Kullu/Kulu). Vowels are kept: without them keys shrink to one or
+# two letters and unrelated words (road/red/ride) collide
+_FOLDS = (("chh", "c"), ("sh", "s"), ("kh", "k"), ("gh", "g"), ("ch", "c"), ("jh", "j"), ("th", "t"),
+          ("dh", "d"), ("ph", "f"), ("bh", "b"), ("ck", "k"), ("w", "v"), ("z", "j"), ("q", "k"), ("x", "ks"))
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_REPEATS_RE = re.compile(r"(.)\1+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    listing_id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    terms BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def tokenize(text):
+    """Lower-case ASCII word tokens, with accents stripped"""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _stem(token):
+    # Plural "s" only: views/view, plots/plot
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def analyze(text):
+    """Index terms for text: stemmed tokens without stopwords"""
+    return [_stem(token) for token in tokenize(text) if token not in STOPWORDS]
+
+
+def phonetic_key(term):
+    """Transliteration-tolerant key for a term, or None for short or numeric terms"""
+    if len(term) < 3 or not term.isalpha():
+        return None
+    for pattern, replacement in _FOLDS:
+        term = term.replace(pattern, replacement)
+    key = _REPEATS_RE.sub(r"\1", term)
+    return key if len(key) >= 3 else None
+
+
+def document_text(listing):
+    return [listing.title] * TITLE_BOOST + [listing.location, listing.district, listing.summary, *listing.features]
+
+
+def document_digest(listing):
+    """Changes whenever the listing's searchable text does"""
+    text = "\x1f".join([str(ANALYZER_VERSION), *document_text(listing)])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def document_terms(listing):
+    """(term counts including sound-alike keys, document length) for a listing"""
+    tokens = analyze(" ".join(document_text(listing)))
+    counts = Counter(tokens)
+    for token in tokens:
+        key = phonetic_key(token)
+        if key:
+            counts[PHONETIC_PREFIX + key] += 1
+    return counts, len(tokens)
+
+
+def encode_postings(ids, tfs):
+    """Sorted listing ids (delta-coded uint32) and term counts (uint8), zlib-compressed"""
+    deltas = np.diff(ids, prepend=0).astype(np.uint32)
+    return zlib.compress(deltas.tobytes() + np.minimum(tfs, 255).astype(np.uint8).tobytes(), 1)
+
+
+def decode_postings(data):
+    raw = zlib.decompress(data)
+    count = len(raw) // 5
+    ids = np.cumsum(np.frombuffer(raw, dtype=np.uint32, count=count), dtype=np.int64)
+    tfs = np.frombuffer(raw, dtype=np.uint8, offset=4 * count).astype(np.float64)
+    return ids, tfs
+
+
+class SearchStore:
+    """SQLite store of the inverted index plus each listing's term counts.
+
+    sync() re-analyzes only listings whose text digest changed and rewrites
+    only the postings of the terms they gained or lost.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            row = self.conn.execute("SELECT value FROM search_meta WHERE key = 'analyzer'").fetchone()
+            if row is None or row[0] != ANALYZER_VERSION:
+                self.conn.execute("DELETE FROM documents")
+                self.conn.execute("DELETE FROM postings")
+                self.conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('analyzer', ?)",
+                                  (ANALYZER_VERSION,))
+
+    def sync(self, listings):
+        """Bring the index up to date with listings; returns how many documents changed"""
+        with self.lock:
+            stored = dict(self.conn.execute("SELECT listing_id, digest FROM documents"))
+            current = {listing.id: listing for listing in listings}
+            changed = [listing for listing in listings if stored.get(listing.id) != document_digest(listing)]
+            removed = [listing_id for listing_id in stored if listing_id not in current]
+            if not changed and not removed:
+                return 0
+
+            # term -> {listing id: new count, or 0 to drop it}
+            edits = {}
+            for listing_id in removed + [listing.id for listing in changed if listing.id in stored]:
+                row = self.conn.execute("SELECT terms FROM documents WHERE listing_id = ?", (listing_id,)).fetchone()
+                for term in json.loads(zlib.decompress(row[0])):
+                    edits.setdefault(term, {})[listing_id] = 0
+            documents = []
+            for listing in changed:
+                counts, length = document_terms(listing)
+                for term, count in counts.items():
+                    edits.setdefault(term, {})[listing.id] = count
+                terms = zlib.compress(json.dumps(counts, separators=(",", ":")).encode("utf-8"))
+                documents.append((listing.id, document_digest(listing), length, terms))
+
+            with self.conn:
+                for term, updates in edits.items():
+                    self._apply(term, updates)
+                self.conn.executemany("DELETE FROM documents WHERE listing_id = ?", [(i,) for i in removed])
+                self.conn.executemany("INSERT OR REPLACE INTO documents (listing_id, digest, length, terms) "
+                                      "VALUES (?, ?, ?, ?)", documents)
+            return len(changed) + len(removed)
+
+    def _apply(self, term, updates):
+        row = self.conn.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchone()
+        added = [(listing_id, count) for listing_id, count in updates.items() if count]
+        ids = np.array([i for i, _ in added], dtype=np.int64)
+        tfs = np.array([c for _, c in added], dtype=np.float64)
+        if row is not None:
+            old_ids, old_tfs = decode_postings(row[0])
+            keep = ~np.isin(old_ids, np.fromiter(updates, dtype=np.int64, count=len(updates)))
+            ids = np.concatenate([old_ids[keep], ids])
+            tfs = np.concatenate([old_tfs[keep], tfs])
+        if not len(ids):
+            self.conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+            return
+        order = np.argsort(ids, kind="stable")
+        self.conn.execute("INSERT OR REPLACE INTO postings (term, data) VALUES (?, ?)",
+                          (term, encode_postings(ids[order], tfs[order])))
+
+    def postings(self, term):
+        """(listing ids, term counts) for a term, or None if no listing has it"""
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchone()
+        return decode_postings(row[0]) if row else None
+
+    def completions(self, prefix, limit=MAX_EXPANSIONS):
+        """Indexed words starting with prefix (not prefix itself), most common first"""
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self.lock:
+            rows = self.conn.execute("SELECT term, data FROM postings WHERE term > ? AND term < ?",
+                                     (prefix, upper)).fetchall()
+        rows.sort(key=lambda row: -len(decode_postings(row[1])[0]))
+        return [term for term, _ in rows[:limit]]
+
+    def lengths(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT listing_id, length FROM documents"))
+
+
+class SearchIndex:
+    """BM25 search over one catalog version.
+
+    A term's postings are read from the store on first use and kept in an
+    LRU as per-listing BM25 contributions, so a query is a few vector adds
+    over the matching listings. Results are cached per query too, since a
+    search is repeated on every rerun while the visitor pages through it.
+    """
+
+    def __init__(self, store, catalog):
+        self.store = store
+        ids = np.array([listing.id for listing in catalog.listings], dtype=np.int64)
+        # Listing id -> catalog index; ids are SQLite rowids, so this stays dense
+        self._position_of = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+        self._position_of[ids] = np.arange(len(ids))
+        stored = store.lengths()
+        lengths = np.array([stored.get(listing.id, 0) for listing in catalog.listings], dtype=np.float64)
+        average = float(lengths.mean()) if len(lengths) else 0.0
+        self._norm = K1 * (1 - B + B * lengths / (average or 1.0))
+        self._postings = OrderedDict()
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._norm)
+
+    def _positions(self, ids):
+        positions = self._position_of[np.minimum(ids, len(self._position_of) - 1)]
+        valid = (positions >= 0) & (ids < len(self._position_of))
+        return positions[valid], valid
+
+    @staticmethod
+    def _cached(cache, key, limit, build):
+        # Small LRU shared by the postings and query caches
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+            return value
+        value = cache[key] = build()
+        while len(cache) > limit:
+            cache.popitem(last=False)
+        return value
+
+    def _term(self, term):
+        """(catalog indices, BM25 contributions) of the listings containing term"""
+        stored = self.store.postings(term)
+        if stored is None or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions, valid = self._positions(stored[0])
+        tfs = stored[1][valid]
+        idf = math.log(1 + (len(self) - len(positions) + 0.5) / (len(positions) + 0.5))
+        return positions, idf * tfs * (K1 + 1) / (tfs + self._norm[positions])
+
+    def _contributions(self, term):
+        with self._lock:
+            return self._cached(self._postings, term, POSTINGS_CACHE_SIZE, lambda: self._term(term))
+
+    def query_terms(self, text):
+        """{index term: weight} for a query.
+
+        Each query term matches itself; if no listing has it, the words it
+        is a prefix of ("gate" -> "gated"); failing that, its sound-alike key.
+        """
+        weights = {}
+        for term in analyze(text):
+            if len(self._contributions(term)[0]):
+                weights[term] = 1.0
+                continue
+            completions = self.store.completions(term) if len(term) >= MIN_PREFIX else []
+            for completion in completions:
+                weights.setdefault(completion, PREFIX_WEIGHT)
+            key = phonetic_key(term)
+            if not completions and key:
+                weights.setdefault(PHONETIC_PREFIX + key, PHONETIC_WEIGHT)
+        return weights
+
+    def scores(self, text):
+        """BM25 score of every listing (catalog order) for a free-text query"""
+        scores = np.zeros(len(self))
+        for term, weight in self.query_terms(text).items():
+            positions, contributions = self._contributions(term)
+            scores[positions] += weight * contributions
+        return scores
+
+    def _rank(self, text):
+        scores = self.scores(text)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits):
+            # Ranks on 16-bit quantized scores: numpy radix-sorts those in O(n)
+            ranks = np.round(scores[hits] * (65535 / scores[hits].max())).astype(np.uint16)
+            hits = hits[np.argsort(65535 - ranks, kind="stable")]
+        hits.setflags(write=False)
+        return hits
+
+    def search(self, text, limit=None):
+        """Catalog indices of listings matching the query, best first"""
+        key = tuple(sorted(set(analyze(text))))
+        with metrics.timer("search.query"):
+            with self._lock:
+                cached = self._queries.get(key)
+                if cached is not None:
+                    self._queries.move_to_end(key)
+            hits = cached if cached is not None else self._rank(text)
+            if cached is None:
+                with self._lock:
+                    self._cached(self._queries, key, QUERY_CACHE_SIZE, lambda: hits)
+        return hits[:limit] if limit else hits
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_db_path():
+    """Location of the search index (SEARCH_DB, default data/search.db)"""
+    return Path(get_snapshot().get_str('SEARCH_DB') or DEFAULT_DB_PATH)
+
+
+def _store(path):
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = SearchStore(path)
+        return store
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _load_index(path, version, _catalog):
+    store = _store(path)
+    with metrics.timer("search.sync"):
+        changed = store.sync(_catalog.listings)
+    if changed:
+        logger.info("Search index: %d listings re-indexed for catalog version %d", changed, version)
+        metrics.incr("search.reindexed", changed)
+    return SearchIndex(store, _catalog)
+
+
+def get_search_index(catalog) -> SearchIndex:
+    """Search index for a catalog, synced once per catalog version"""
+    return _load_index(str(get_db_path()), catalog.version, catalog)
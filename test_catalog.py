@@ -0,0 +1,52 @@
+"""Tests for the catalog store (python -m pytest -q)"""
+import threading
+
+import pytest
+
+from catalog import catalog_version, get_catalog, upsert_listing
+
+LISTING = {"slug": "orchard-kullu", "title": "Apple Orchard", "location": "Kullu", "district": "Kullu",
+           "price_text": "₹5 Lakhs per bigha", "area_text": "10 bigha", "features": ["Mature trees"],
+           "featured": True}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "catalog.db"
+    upsert_listing(LISTING, path=path)
+    return path
+
+
+def test_partial_update_reprices(path):
+    upsert_listing({"slug": "orchard-kullu", "price_text": "₹6 Lakhs per bigha"}, path=path)
+    listing = get_catalog(path).get("orchard-kullu")
+    assert (listing.title, listing.featured, listing.features) == ("Apple Orchard", True, ("Mature trees",))
+    assert listing.price_text == "₹6 Lakhs per bigha"
+    # The stored area text still applies to the new rate
+    assert listing.price_min == pytest.approx(60e5)
+
+
+def test_partial_update_moves_coordinates(path):
+    before = get_catalog(path).get("orchard-kullu")
+    upsert_listing({"slug": "orchard-kullu", "location": "Shimla"}, path=path)
+    after = get_catalog(path).get("orchard-kullu")
+    assert after.district == "Kullu"
+    assert (after.latitude, after.longitude) != (before.latitude, before.longitude)
+
+
+def test_connection_shared_across_threads(path):
+    errors = []
+
+    def reprice(number):
+        try:
+            upsert_listing({"slug": "orchard-kullu", "sort_order": number}, path=path)
+            catalog_version(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reprice, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
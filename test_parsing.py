@@ -0,0 +1,82 @@
+"""Tests for the price and area parsers (python -m pytest -q)"""
+import math
+
+import pytest
+
+from parsing import AREA_UNITS, AreaRange, PriceRange, normalize_listing, parse_area, parse_price, parse_unit
+
+
+@pytest.mark.parametrize("text, unit", [
+    ("sq.ft.", "sqft"), ("sq ft", "sqft"), ("square feet", "sqft"),
+    ("sq. yards", "sqyd"), ("gaj", "sqyd"), ("sq.m", "sqm"),
+    ("acre", "acre"), ("Acres", "acre"),
+    ("hectare", "hectare"), ("2 ha", "hectare"),
+    ("bigha", "bigha"), ("Bighas", "bigha"), ("biswa", "biswa"),
+    ("kanal", "kanal"), ("marla", "marla"),
+])
+def test_parse_unit(text, unit):
+    assert parse_unit(text) == AREA_UNITS[unit]
+
+
+def test_parse_unit_unknown():
+    assert parse_unit("plot") is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("₹30 Lakhs - ₹50 Lakhs", PriceRange(30e5, 50e5)),
+    ("₹30-50 Lakhs", PriceRange(30e5, 50e5)),
+    ("₹1.5 Cr", PriceRange(1.5e7, 1.5e7)),
+    ("₹1.2 Crore onwards", PriceRange(1.2e7, math.inf)),
+    ("Starting from ₹25 Lakhs", PriceRange(25e5, math.inf)),
+    ("Up to ₹80 Lacs", PriceRange(0.0, 80e5)),
+    ("₹12,50,000", PriceRange(12.5e5, 12.5e5)),
+    # "per" inside a word is not a rate
+    ("Superb deal ₹40 Lakhs", PriceRange(40e5, 40e5)),
+    ("Property price ₹25 Lakhs", PriceRange(25e5, 25e5)),
+    ("₹30 Lakhs - ₹50 Lakhs per acre", PriceRange(30e5, 50e5, AREA_UNITS["acre"])),
+    ("₹2200-₹2600 per sq.ft.", PriceRange(2200.0, 2600.0, 1.0)),
+    ("₹5 Lakhs per bigha", PriceRange(5e5, 5e5, AREA_UNITS["bigha"])),
+    ("₹8 Lakhs / kanal", PriceRange(8e5, 8e5, AREA_UNITS["kanal"])),
+    ("₹1 Crore per hectare", PriceRange(1e7, 1e7, AREA_UNITS["hectare"])),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", None, "Price on request"])
+def test_parse_price_missing(text):
+    assert parse_price(text) is None
+
+
+@pytest.mark.parametrize("text, low, high", [
+    ("2400-5000 sq.ft. plots", 2400.0, 5000.0),
+    ("5-10 Acres available", 5 * 43560.0, 10 * 43560.0),
+    ("10 bigha to 20 bigha", 10 * 8712.0, 20 * 8712.0),
+    ("10 to 20 marla", 10 * 272.25, 20 * 272.25),
+    ("3 kanal", 3 * 5445.0, 3 * 5445.0),
+    ("1.5 hectares", 1.5 * 107639.0, 1.5 * 107639.0),
+    ("1,200 sq.ft.", 1200.0, 1200.0),
+    ("Plot 12: 5 acres", 5 * 43560.0, 5 * 43560.0),
+    ("Khasra no. 45, 2 kanal", 2 * 5445.0, 2 * 5445.0),
+    ("2500", 2500.0, 2500.0),
+])
+def test_parse_area(text, low, high):
+    assert parse_area(text) == AreaRange(pytest.approx(low), pytest.approx(high))
+
+
+def test_normalize_listing_rate_times_area():
+    result = normalize_listing("₹5 Lakhs per bigha", "10 bigha to 20 bigha")
+    assert result["price_min"] == pytest.approx(50e5)
+    assert result["price_max"] == pytest.approx(100e5)
+    assert result["rate_min"] == result["rate_max"] == pytest.approx(5e5 / 8712.0)
+    assert result["area_min"] == pytest.approx(87120.0)
+
+
+def test_normalize_listing_total_price_gives_rate():
+    result = normalize_listing("₹35 Lakhs", "2500 sq.ft.")
+    assert result["price_min"] == result["price_max"] == 35e5
+    assert result["rate_min"] == pytest.approx(35e5 / 2500)
+
+
+def test_normalize_listing_unknown():
+    assert set(normalize_listing(None, None).values()) == {None}
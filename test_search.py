@@ -0,0 +1,63 @@
+"""Tests for listing search (python -m pytest -q)"""
+import pytest
+
+from catalog import get_catalog, upsert_listing
+from search import SearchIndex, SearchStore, phonetic_key
+
+LISTINGS = [
+    {"slug": "deodar-manali", "title": "Deodar Forest Plots", "location": "Manali", "district": "Kullu",
+     "summary": "Forest facing plots in a gated community", "features": ["Dense deodar forest view"]},
+    {"slug": "river-kullu", "title": "Riverside Land", "location": "Kullu", "district": "Kullu",
+     "summary": "Adjacent to the Beas river", "features": ["Peaceful environment"]},
+    {"slug": "hilltop-shimla", "title": "Premium Hilltop Land", "location": "Shimla", "district": "Shimla",
+     "summary": "Valley views and all-weather road connectivity", "features": ["Ideal for resort"]},
+    {"slug": "orchard-dharamshala", "title": "Apple Orchard", "location": "Dharamshala", "district": "Kangra",
+     "summary": "Mature apple trees near the mall", "features": ["Mountain view"]},
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    work = tmp_path_factory.mktemp("search")
+    for listing in LISTINGS:
+        upsert_listing(listing, path=work / "catalog.db")
+    catalog = get_catalog(work / "catalog.db")
+    store = SearchStore(work / "search.db")
+    store.sync(catalog.listings)
+    return catalog, SearchIndex(store, catalog)
+
+
+def slugs(index, query):
+    catalog, search_index = index
+    return [catalog.listings[i].slug for i in search_index.search(query)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("deodar", ["deodar-manali"]),
+    ("river", ["river-kullu"]),
+    ("gate", ["deodar-manali"]),
+    ("Simla", ["hilltop-shimla"]),
+    ("kulu", ["river-kullu", "deodar-manali"]),
+    ("Dharamsala", ["orchard-dharamshala"]),
+])
+def test_search_matches(index, query, expected):
+    # The store also holds the seed listings; only these fixtures are checked
+    ours = {listing["slug"] for listing in LISTINGS}
+    assert [slug for slug in slugs(index, query) if slug in ours] == expected
+
+
+@pytest.mark.parametrize("query", ["ready", "red", "via", "ride", "mile", "xyz"])
+def test_search_unrelated_words_match_nothing(index, query):
+    assert slugs(index, query) == []
+
+
+@pytest.mark.parametrize("term", ["road", "red", "ready", "ride", "view", "via", "mall", "mile", "deodar"])
+def test_phonetic_keys_keep_words_apart(term):
+    others = {"road", "red", "ready", "ride", "view", "via", "mall", "mile", "deodar"} - {term}
+    key = phonetic_key(term)
+    assert key is None or key not in {phonetic_key(other) for other in others}
+
+
+@pytest.mark.parametrize("a, b", [("shimla", "simla"), ("kullu", "kulu"), ("dharamshala", "dharamsala")])
+def test_phonetic_keys_fold_spelling_variants(a, b):
+    assert phonetic_key(a) == phonetic_key(b)